@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Measure the synchronization of two Dojo peers over localhost.
+
+Both peers run headless in the same process, with a virtual clock
+advancing by one frame per iteration. Their transports inject the given
+latency, jitter and packet loss. The players are driven by seeded random
+inputs registered through the network controllers. At the end, the
+inputs are flushed and the two models are compared at the same tick to
+detect any desynchronization.
+
+With **--reset-period**, both peers also reset the round in place at
+the same ticks, so the rollbacks span the resets.
+
+In rollback mode, the rollback count, the number of simulated ticks and
+the rollback durations are reported for each peer. In lockstep mode, the
+stalls, the waits, the round trip time and the final input delay are
+reported instead.
+
+Usage:
+
+    $ python benchmarks/network_loopback.py --latency 0.05 --loss 0.05
+    $ python benchmarks/network_loopback.py --lockstep --jitter 0.02
+    $ python benchmarks/network_loopback.py --reset-period 300
+"""
+
+# Imports
+import os
+import sys
+import random
+import argparse
+
+# Headless display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from mvctools import Dir
+from mvctools.network import UDPTransport, network_state
+from mvctools.network import RollbackSession, LockstepSession
+from dojo import Dojo
+from dojo.network import MatchState
+
+
+# Virtual clock
+class VirtualClock(object):
+    """Time function driven by the benchmark loop."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Random inputs
+class RandomPlayer(object):
+    """Register random directions, jumps and resets."""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.activate = False
+
+    def play(self, state):
+        controller = self.random.random
+        if controller() < 0.05:
+            direction = self.random.choice(Dir.DIRS + [Dir.NONE])
+            state.controller.register("dir", direction, 1)
+        if controller() < 0.04:
+            self.activate = not self.activate
+            state.controller.register("activate", self.activate, 1)
+        if controller() < 0.005:
+            state.controller.register("start", True)
+            state.controller.register("start", False)
+
+
+# Model signature
+def signature(state):
+    """Return the values to compare between the peers."""
+    room = state.model.room
+    registered = state.model.children.get(room.key) is room
+    values = [state.tick_count, registered, room.collision_count,
+              room.score_dct[1], room.score_dct[2]]
+    for pid in (1, 2):
+        player = room.players[pid]
+        values += [tuple(player.rect), tuple(player.speed),
+                   tuple(player.remainder), player.fixed, player.ko]
+    return values
+
+
+# Periodic resets
+class ResetMatchState(MatchState):
+    """Match state ending the round every **reset_period** ticks.
+
+    The second player is knocked out, then a start action resets the
+    round a few ticks later, as after a regular game over.
+    """
+
+    reset_period = 0
+
+    def simulate_tick(self):
+        tick = self.tick_count
+        if self.reset_period and tick:
+            phase = tick % self.reset_period
+            if phase == 0:
+                self.model.room.players[2].set_ko()
+            elif phase == 5:
+                self.model.register("start", True)
+        return MatchState.simulate_tick(self)
+
+
+# Benchmark
+def create_peers(session_class, latency, jitter, loss, reset_period=0):
+    """Create the host and guest states."""
+    clock = VirtualClock()
+    address = "127.0.0.1", 0
+    host = UDPTransport(address, None, latency, jitter, loss, 1, clock)
+    guest = UDPTransport(address, host.address, latency, jitter, loss, 2,
+                         clock)
+    states = []
+    for transport, players in ((host, (1, 2)), (guest, (2, 1))):
+        control = Dojo()
+        control.pre_run()
+        match_class = type("ResetMatchState", (ResetMatchState,),
+                           {"reset_period": reset_period})
+        state_class = network_state(match_class, transport, players[0],
+                                    players[1], session_class)
+        states.append(state_class(control, headless=True))
+    return clock, states
+
+
+def run(session_class, frames, latency=0.05, jitter=0.01, loss=0.05,
+        drain=120, reset_period=0):
+    """Run the peers and return (states, in sync)."""
+    clock, states = create_peers(session_class, latency, jitter, loss,
+                                 reset_period)
+    fps = states[0].sim_rate
+    players = [RandomPlayer(1), RandomPlayer(2)]
+    for frame in range(frames + drain):
+        clock.now = frame / fps
+        for state, player in zip(states, players):
+            if frame < frames:
+                player.play(state)
+            if state.tick():
+                return states, None
+            state.frame_timer.end_frame()
+    # Bring the late peer to the same tick
+    for frame in range(frames + drain, frames + 2 * drain):
+        late, early = sorted(states, key=lambda state: state.tick_count)
+        if late.tick_count == early.tick_count:
+            break
+        clock.now = frame / fps
+        early.session.transport.flush()
+        late.tick()
+    return states, signature(states[0]) == signature(states[1])
+
+
+def print_rollbacks(states):
+    print("{0:<6} {1:>6} {2:>9} {3:>7} {4:>7} {5:>8} {6:>8} {7:>8} "
+          "{8:>8}".format("peer", "ticks", "rollbacks", "resim", "stalls",
+                          "p50 ms", "p99 ms", "max ms", "us/tick"))
+    for name, state in zip(("host", "guest"), states):
+        report = state.session.report()
+        resim = report["resimulated"]
+        total = sum(state.session.resim_times.get_values())
+        print("{0:<6} {1:>6} {2:>9} {3:>7} {4:>7} {5:>8.3f} {6:>8.3f} "
+              "{7:>8.3f} {8:>8.1f}".format(
+                  name, report["ticks"], report["rollbacks"], resim,
+                  report["stalls"], 1000 * report["resim_times"][0],
+                  1000 * report["resim_times"][2],
+                  1000 * report["resim_max"],
+                  1e6 * total / resim if resim else 0.0))
+    print("frame budget: {0:.2f} ms, max rollback: {1} ticks".format(
+        1000.0 / states[0].sim_rate, RollbackSession.max_rollback))
+
+
+def print_lockstep(states):
+    print("{0:<6} {1:>6} {2:>7} {3:>9} {4:>9} {5:>9} {6:>8} {7:>6}".format(
+        "peer", "ticks", "stalls", "wait p50", "wait p99", "wait sum",
+        "rtt p50", "delay"))
+    for name, state in zip(("host", "guest"), states):
+        report = state.session.report()
+        print("{0:<6} {1:>6} {2:>7} {3:>9.1f} {4:>9.1f} {5:>9.1f} "
+              "{6:>8.1f} {7:>6}".format(
+                  name, report["ticks"], report["stalls"],
+                  1000 * report["wait_times"][0],
+                  1000 * report["wait_times"][2],
+                  1000 * report["wait_total"],
+                  1000 * report["rtt"][0], report["input_delay"]))
+    print("durations in ms of virtual time")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--frames", type=int, default=3600)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--loss", type=float, default=0.05)
+    parser.add_argument("--lockstep", action="store_true")
+    parser.add_argument("--reset-period", type=int, default=0,
+                        help="reset the round every N ticks")
+    namespace = parser.parse_args(args)
+    session_class = LockstepSession if namespace.lockstep else RollbackSession
+    states, synced = run(session_class, namespace.frames, namespace.latency,
+                         namespace.jitter, namespace.loss,
+                         reset_period=namespace.reset_period)
+    if namespace.lockstep:
+        print_lockstep(states)
+    else:
+        print_rollbacks(states)
+    print("state: " + {True: "in sync", False: "DESYNC",
+                       None: "stopped"}[synced])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""Count the vector allocations per frame in the Dojo physics loop.
+
+The attract mode (both players driven by the AI) runs headless with a
+fixed time step, first with the former xytuple-based physics, then with
+the current xyvector-based physics. The number of xytuple and xyvector
+instances created during the model updates is reported per frame.
+
+Usage:
+
+    $ python benchmarks/physics_alloc.py [frames]
+"""
+
+# Imports
+import os
+import sys
+import random
+from timeit import default_timer
+
+# Headless display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from mvctools import Dir, xytuple, xyvector
+from dojo import Dojo
+from dojo.model import PlayerModel, RoomModel
+from dojo.state import DojoMainState
+
+
+# Former implementation
+def legacy_update(self):
+    """PlayerModel.update using xytuple operations."""
+    acc = -self.speed * self.air_friction
+    acc += self.gravity
+    self.speed += self.delta_tuple * acc
+    if self.fixed:
+        self.speed *= 0, 0
+    step = self.delta_tuple * self.speed
+    step += self.remainder
+    intstep = step.map(round)
+    self.remainder = step - intstep
+    args = self.rect, self.rect.move(intstep)
+    self.steps = list(Dir.generate_rects(*args))
+    if self.loading:
+        delta = self.load_factor_max - self.load_factor_min
+        ratio = self.load_factor_min + self.loading_ratio * delta
+        self.timer.start(ratio)
+
+
+def legacy_update_speed(self):
+    """RoomModel.update_speed using xytuple operations."""
+    lst = [float("inf")]
+    for i in (1, 2):
+        j = 2 if i == 1 else 1
+        pos_1 = xytuple(*self.players[i].legs.center)
+        if not any(pos_1):
+            continue
+        pos_2 = xytuple(*self.players[j].head.center)
+        pos_3 = xytuple(*self.players[j].body.center)
+        lst.append(abs(pos_1-pos_2))
+        lst.append(abs(pos_1-pos_3))
+    if not self.colliding and min(lst) > float(self.threshold):
+        if self.time_speed:
+            self.time_speed = 1.0
+        self.parent.reset_camera()
+        return
+    if self.time_speed:
+        self.time_speed = self.slow_ratio
+    new_zoom = not self.parent.is_camera_set
+    area = self.players[1].rect.union(self.players[2].rect)
+    center = area.center
+    area.h = max(area.h, self.rect.h/2)
+    area.w = max(area.w, self.rect.w/2)
+    area.center = center
+    self.parent.set_camera(area.clamp(self.rect))
+    return new_zoom
+
+
+# Allocation counter
+class AllocationCounter(object):
+    """Count the instances created for the vector classes."""
+
+    def __init__(self):
+        self.counts = {xytuple: 0, xyvector: 0}
+        self.enabled = False
+        self.tuple_new = xytuple.__new__
+        self.vector_init = xyvector.__init__
+
+    def install(self):
+        counter = self
+
+        def tuple_new(cls, *args):
+            if counter.enabled:
+                counter.counts[xytuple] += 1
+            return counter.tuple_new(cls, *args)
+
+        def vector_init(self, *args):
+            if counter.enabled:
+                counter.counts[xyvector] += 1
+            counter.vector_init(self, *args)
+
+        xytuple.__new__ = staticmethod(tuple_new)
+        xyvector.__init__ = vector_init
+
+    def uninstall(self):
+        xytuple.__new__ = staticmethod(self.tuple_new)
+        xyvector.__init__ = self.vector_init
+
+
+# Benchmark
+def run(control, frames, legacy):
+    """Run the physics loop and return (allocations, duration)."""
+    counter = AllocationCounter()
+    counter.install()
+    patched = PlayerModel.update, RoomModel.update_speed
+    if legacy:
+        PlayerModel.update = legacy_update
+        RoomModel.update_speed = legacy_update_speed
+    random.seed(0)
+    duration, count = 0.0, 0
+    try:
+        while count < frames:
+            state = DojoMainState(control, headless=True)
+            state.current_fps = float(control.settings.fps)
+            state.model.start_timer.set()
+            if legacy:
+                for player in state.model.room.players.values():
+                    player.speed = xytuple(player.speed)
+                    player.remainder = xytuple(player.remainder)
+            while count < frames:
+                counter.enabled = True
+                start = default_timer()
+                stop = state.tick()
+                duration += default_timer() - start
+                counter.enabled = False
+                count += 1
+                if stop:
+                    break
+    finally:
+        PlayerModel.update, RoomModel.update_speed = patched
+        counter.uninstall()
+    return counter.counts, duration
+
+
+def main(frames=5000):
+    control = Dojo()
+    control.pre_run()
+    line = "{0:<8} {1:>12.2f} {2:>13.2f} {3:>12.1f}"
+    print("{0:<8} {1:>12} {2:>13} {3:>12}".format(
+        "physics", "xytuple/frm", "xyvector/frm", "us/frame"))
+    for name, legacy in (("before", True), ("after", False)):
+        counts, duration = run(control, frames, legacy)
+        print(line.format(name,
+                          float(counts[xytuple]) / frames,
+                          float(counts[xyvector]) / frames,
+                          1e6 * duration / frames))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
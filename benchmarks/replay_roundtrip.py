@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Check and measure the recording and the replay of a Dojo match.
+
+The action arguments supported by the replay format are first encoded
+and decoded, and compared to the original values. A two players match
+is then driven by random actions in headless mode, recorded to a
+temporary file and replayed. The players of both runs are compared at
+the end, along with the simulation and replay times and the file size.
+
+The script exits with an error status if any of the checks fails.
+
+Usage:
+
+    $ python benchmarks/replay_roundtrip.py [ticks]
+"""
+
+# Imports
+import os
+import sys
+import random
+import shutil
+import tempfile
+from timeit import default_timer
+
+# Headless display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from mvctools import Dir, replay
+from mvctools.replay import encode_value, decode_value
+from dojo import Dojo
+from dojo.state import TwoPlayersState
+from dojo.controller import DojoController
+
+
+# Argument values
+VALUES = [None, True, False, 0, -7, 2**31 - 1, -2**31, 2**31, -2**40,
+          2**63 - 1, 0.5, -1e300, "start", u"\xe9t\xe9", "",
+          (1, 2), (0.5, -3), (None, "player")]
+
+
+# Scripted controller
+class ScriptController(DojoController):
+    """Controller registering random actions for both players."""
+
+    def _update(self):
+        for pid in (1, 2):
+            r = random.random()
+            if r < 0.03:
+                if self.register("dir", random.choice(Dir.DIRS), pid):
+                    return True
+            elif r < 0.05:
+                if self.register("activate", random.random() < 0.6, pid):
+                    return True
+
+
+# Scripted state
+class ScriptState(TwoPlayersState):
+    controller_class = ScriptController
+
+
+# Checks
+def check_values():
+    """Return the values that do not survive the encoding."""
+    failed = []
+    for value in VALUES:
+        data = encode_value(value)
+        decoded, offset = decode_value(data, 0)
+        if decoded != value or offset != len(data):
+            failed.append(value)
+    return failed
+
+
+def summary(state):
+    """Return the final positions and scores of a match."""
+    players = state.model.room.players
+    return ([(player.rect.topleft, player.ko, tuple(player.speed))
+             for player in players.values()],
+            dict(state.model.room.score_dct), state.tick_count)
+
+
+def run(ticks):
+    """Record a match, replay it and return the statistics."""
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "match.mvcr")
+    try:
+        # Record
+        random.seed(0)
+        control = Dojo()
+        control.pre_run()
+        control.settings.record = filename
+        state = ScriptState(control, headless=True)
+        start = default_timer()
+        state.run_headless(max_ticks=ticks)
+        state.clean()
+        recording = default_timer() - start
+        expected = summary(state)
+        # Replay
+        control.settings.record = ""
+        del control.gamedata.score_dct
+        start = default_timer()
+        replayed = replay(control, filename)
+        replaying = default_timer() - start
+        return {"recording": recording,
+                "replaying": replaying,
+                "size": os.path.getsize(filename),
+                "ticks": state.tick_count,
+                "synced": summary(replayed) == expected}
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(ticks=3000):
+    failed = check_values()
+    print("values: {0}".format("ok" if not failed else failed))
+    stats = run(int(ticks))
+    print("ticks: {0}, file: {1} bytes".format(stats["ticks"],
+                                               stats["size"]))
+    print("recording: {0:.1f} us/tick, replay: {1:.1f} us/tick".format(
+        1e6 * stats["recording"] / stats["ticks"],
+        1e6 * stats["replaying"] / stats["ticks"]))
+    print("replay: {0}".format("in sync" if stats["synced"] else "DESYNC"))
+    return 0 if stats["synced"] and not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Measure the cost of streaming a Dojo match to many spectators.
+
+The attract mode (both players driven by the AI) runs headless and is
+broadcast over localhost to a growing number of spectator clients, all
+in the same process. The broadcast time and the bytes sent are reported
+per tick and per spectator, along with the decoding time of a client.
+
+One of the spectators is a full spectator state, displaying the stream
+with the dojo view. Its players are compared to the server ones at the
+end of each run.
+
+Usage:
+
+    $ python benchmarks/spectator_fanout.py [frames]
+"""
+
+# Imports
+import os
+import sys
+import random
+from timeit import default_timer
+
+# Headless display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from mvctools import BaseState
+from mvctools.spectator import SpectatorServer, SpectatorClient
+from dojo import Dojo
+from dojo.view import DojoView
+from dojo.state import NoPlayerModel
+from dojo.controller import DojoController
+from dojo.spectator import FORMATS, SpectatorState, spectated_state
+
+
+# Attract state
+class AttractState(BaseState):
+    model_class = NoPlayerModel
+    controller_class = DojoController
+    view_class = DojoView
+
+
+# Timed server
+class TimedServer(SpectatorServer):
+    """Spectator server measuring its broadcast time."""
+
+    duration = 0.0
+
+    def broadcast(self, tick, values):
+        start = default_timer()
+        SpectatorServer.broadcast(self, tick, values)
+        self.duration += default_timer() - start
+
+
+# Benchmark
+def run(spectators, frames):
+    """Broadcast a match and return the statistics."""
+    random.seed(0)
+    server_control, client_control = Dojo(), Dojo()
+    server_control.pre_run()
+    server = TimedServer(("127.0.0.1", 0), FORMATS)
+    state = spectated_state(AttractState, server)(server_control,
+                                                  headless=True)
+    state.current_fps = float(server_control.settings.fps)
+    state.model.start_timer.set()
+    # Clients
+    clients = [SpectatorClient(server.address, FORMATS, ("127.0.0.1", 0))
+               for _ in range(spectators)]
+    attrs = {"client": clients[0]}
+    spectator_class = type("SpectatorState", (SpectatorState,), attrs)
+    spectator = spectator_class(client_control, headless=True)
+    spectator.current_fps = state.current_fps
+    for client in clients[1:]:
+        client.hello()
+    # Loop
+    decoding = rendering = 0.0
+    for _ in range(frames):
+        state.tick()
+        start = default_timer()
+        for client in clients[1:]:
+            client.receive()
+        decoding += default_timer() - start
+        start = default_timer()
+        spectator.tick()
+        rendering += default_timer() - start
+    # Compare the last tick
+    players = state.model.room.players
+    watched = spectator.model.room.players
+    synced = all(players[pid].rect == watched[pid].rect for pid in (1, 2))
+    lost = sum(client.lost for client in clients)
+    server.close()
+    for client in clients:
+        client.close()
+    return {"broadcast": server.duration / frames,
+            "bytes": float(server.bytes) / max(server.packets, 1),
+            "decoding": decoding / frames / max(spectators - 1, 1),
+            "rendering": rendering / frames,
+            "spectators": len(server.spectators),
+            "lost": lost,
+            "synced": synced}
+
+
+def main(frames=1200):
+    print("{0:>10} {1:>10} {2:>12} {3:>11} {4:>11} {5:>11} {6:>5} "
+          "{7:>6}".format("spectators", "us/tick", "us/spectator",
+                          "bytes/pkt", "decode us", "view us", "lost",
+                          "sync"))
+    for spectators in (1, 10, 25, 50):
+        stats = run(spectators, int(frames))
+        n = float(stats["spectators"] or 1)
+        print("{0:>10} {1:>10.1f} {2:>12.2f} {3:>11.1f} {4:>11.1f} "
+              "{5:>11.1f} {6:>5} {7:>6}".format(
+                  stats["spectators"], 1e6 * stats["broadcast"],
+                  1e6 * stats["broadcast"] / n, stats["bytes"],
+                  1e6 * stats["decoding"], 1e6 * stats["rendering"],
+                  stats["lost"], "yes" if stats["synced"] else "no"))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
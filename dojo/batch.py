@@ -0,0 +1,240 @@
+"""Run headless matches in parallel to tune the game parameters.
+
+Each match runs in a worker process without any window: the dummy SDL
+video driver is used and no display mode is set. A match stops at the
+first KO, or after a maximum number of ticks. The players are either
+driven by the random AI, or by the actions of a replay file (see the
+**record** setting). In the latter case, the match stops at the end of
+the replay and the AI players of the recorded state keep using the
+random AI.
+
+The matches are played for every combination of the given damping,
+threshold and slow ratio values, and a summary is printed for each one.
+
+Usage:
+
+    $ python -m dojo.batch --matches 1000 --damping 0.6 0.8 1.0
+"""
+
+# Imports
+import os
+import signal
+import random
+import argparse
+from itertools import product
+from multiprocessing import Pool, cpu_count
+import pygame
+
+# Imports from mvctools
+from mvctools import BaseState, BaseController, replay_state
+from mvctools.common import cache
+from mvctools.replay import ReplayReader
+
+# Imports from dojo
+from dojo import Dojo
+from dojo.view import DojoView
+from dojo.model import DojoModel, RoomModel
+from dojo.state import AIModel
+
+
+# Tuned parameters
+PARAMETERS = "damping", "threshold", "slow_ratio"
+
+
+# Batch model
+class BatchModel(AIModel):
+    """Both players driven by the AI, stop at the first KO."""
+
+    ai_players = 1, 2
+
+    def post_update(self):
+        """Stop the state at the first KO."""
+        DojoModel.post_update(self)
+        if self.room.gameover:
+            return True
+        self.update_ai()
+
+
+# Batch state
+class BatchState(BaseState):
+    """Headless state for the random AI matches.
+
+    The events are processed by the base controller, so the joysticks
+    are not initialized for every match.
+    """
+    model_class = BatchModel
+    controller_class = BaseController
+    view_class = DojoView
+
+
+# State factory
+@cache
+def get_state_class(params, script=None, ai_speed=BatchModel.ai_speed):
+    """Return the state class for the given parameters.
+
+    Args:
+        params (tuple): damping, threshold and slow ratio values
+        script (str): replay file to drive the players (optional)
+        ai_speed (float): jump rate of the AI players
+    """
+    state_class = ReplayReader(script).state_class if script else BatchState
+    room_class = type("TunedRoomModel", (RoomModel,),
+                      dict(zip(PARAMETERS, params)))
+    model_class = type("Tuned" + state_class.model_class.__name__,
+                       (state_class.model_class,),
+                       {"room_class": room_class, "ai_speed": ai_speed})
+    state_class = type("Tuned" + state_class.__name__, (state_class,),
+                       {"model_class": model_class})
+    return replay_state(state_class, script) if script else state_class
+
+
+# Match outcome
+def get_outcome(state):
+    """Return the outcome of a match as a dictionary.
+
+    The winner is None for timeouts and double KOs.
+    """
+    room = state.model.room
+    kos = [pid for pid in (1, 2) if room.players[pid].ko]
+    winner = None
+    if len(kos) == 1:
+        winner = 2 if kos == [1] else 1
+    return {"winner": winner,
+            "score": (room.score_dct[1], room.score_dct[2]),
+            "ticks": state.tick_count,
+            "collisions": room.collision_count,
+            "timeout": not kos}
+
+
+# Worker
+control = None
+
+
+def init_worker():
+    """Initialize the pygame events without setting a display mode."""
+    global control
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "disk"
+    pygame.display.init()
+    # SDL catches the termination signal
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    control = Dojo()
+
+
+def run_match(task):
+    """Run a single match and return (index, outcome)."""
+    index, params, seed, script, ai_speed, max_ticks = task
+    random.seed(seed)
+    state = get_state_class(params, script, ai_speed)(control, headless=True)
+    state.run_headless(max_ticks)
+    outcome = get_outcome(state)
+    del control.gamedata.score_dct
+    return index, outcome
+
+
+# Summary
+class Summary(object):
+    """Aggregate the outcomes of the matches for a set of parameters."""
+
+    def __init__(self, params):
+        self.params = params
+        self.matches = 0
+        self.wins = {1: 0, 2: 0, None: 0}
+        self.timeouts = 0
+        self.ticks = 0
+        self.collisions = 0
+        self.hits = 0
+
+    def add(self, outcome):
+        """Add the outcome of a match."""
+        self.matches += 1
+        self.wins[outcome["winner"]] += 1
+        self.timeouts += outcome["timeout"]
+        self.ticks += outcome["ticks"]
+        self.collisions += outcome["collisions"]
+        self.hits += sum(outcome["score"])
+
+    header = ("{:>8} {:>9} {:>10} {:>7} {:>6} {:>6} {:>6} {:>8} "
+              "{:>8} {:>8} {:>6}").format("damping", "threshold",
+                                          "slow_ratio", "matches",
+                                          "p1", "p2", "draw", "timeout",
+                                          "ticks", "collide", "hits")
+
+    def __str__(self):
+        n = float(self.matches or 1)
+        return ("{:>8} {:>9} {:>10} {:>7} {:>6.1%} {:>6.1%} {:>6.1%} "
+                "{:>8.1%} {:>8.1f} {:>8.2f} {:>6.2f}").format(
+                    self.params[0], self.params[1], self.params[2],
+                    self.matches, self.wins[1] / n, self.wins[2] / n,
+                    self.wins[None] / n, self.timeouts / n,
+                    self.ticks / n, self.collisions / n, self.hits / n)
+
+
+# Batch function
+def run_batch(grid, matches, processes=None, seed=0, script=None,
+              ai_speed=BatchModel.ai_speed, max_ticks=3600):
+    """Run the matches for all the parameters and return the summaries.
+
+    Args:
+        grid (list): list of (damping, threshold, slow_ratio) tuples
+        matches (int): number of matches for each parameter set
+        processes (int): number of worker processes (default: cpu count)
+        seed (int): seed of the first match
+        script (str): replay file to drive the players (optional)
+        ai_speed (float): jump rate of the AI players
+        max_ticks (int): maximum duration of a match in ticks
+
+    The same seeds are used for every parameter set.
+    """
+    summaries = [Summary(params) for params in grid]
+    tasks = ((index, params, seed + match, script, ai_speed, max_ticks)
+             for index, params in enumerate(grid)
+             for match in range(matches))
+    processes = processes or cpu_count()
+    chunksize = max(1, len(grid) * matches // (processes * 16))
+    pool = Pool(processes, init_worker)
+    try:
+        for index, outcome in pool.imap_unordered(run_match, tasks,
+                                                  chunksize):
+            summaries[index].add(outcome)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return summaries
+
+
+# Main function
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--matches", type=int, default=100,
+                        help="matches per parameter set (default: 100)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: cpu count)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first match (default: 0)")
+    parser.add_argument("--max-ticks", type=int, default=3600,
+                        help="maximum ticks per match (default: 3600)")
+    parser.add_argument("--ai-speed", type=float, default=BatchModel.ai_speed,
+                        help="AI jump rate in s-1 (default: %(default)s)")
+    parser.add_argument("--script", default=None,
+                        help="replay file to drive the players")
+    parser.add_argument("--damping", type=float, nargs="+",
+                        default=[RoomModel.damping])
+    parser.add_argument("--threshold", type=int, nargs="+",
+                        default=[RoomModel.threshold])
+    parser.add_argument("--slow-ratio", type=float, nargs="+",
+                        default=[RoomModel.slow_ratio])
+    namespace = parser.parse_args(args)
+    grid = list(product(namespace.damping, namespace.threshold,
+                        namespace.slow_ratio))
+    summaries = run_batch(grid, namespace.matches, namespace.processes,
+                          namespace.seed, namespace.script,
+                          namespace.ai_speed, namespace.max_ticks)
+    print(Summary.header)
+    for summary in summaries:
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 
 # Imports
 import pygame
-from mvctools import xytuple
+from weakref import WeakKeyDictionary
+from mvctools.common import cache
 
 
 # Opacify function
@@ -40,18 +41,43 @@ def flatten(iterator):
             yield item
 
 
+# Mask cache
+mask_cache = WeakKeyDictionary()
+
+
+# Mask function
+def get_mask(image):
+    """Get the collision mask of a surface.
+
+    The mask is computed once per surface and cached as long as
+    the surface exists. Any pixel that is not fully transparent
+    is considered solid.
+    """
+    try:
+        return mask_cache[image]
+    except KeyError:
+        mask = mask_cache[image] = pygame.mask.from_surface(image, 0)
+        return mask
+
+
+# Area mask function
+@cache
+def get_area_mask(size):
+    """Get a filled mask of the given size."""
+    return pygame.mask.Mask(size, True)
+
+
 # Perfect collision function
 def perfect_collide(rect1, img1, pos1, rect2, img2, pos2):
     """Perform a pixel-perfect collision test using transparency.
 
     It takes the inner rectangle, image and position for both elements.
+    The test relies on the cached masks of the images.
     """
     rect = rect1.clip(rect2)
     if not rect:
         return False
-    flag = pygame.BLEND_RGBA_MIN
-    pos1, pos2 = xytuple(pos1), xytuple(pos2)
-    surf = pygame.Surface(rect.size).convert_alpha()
-    surf.blit(img1, (0, 0), area=rect.move(-pos1), special_flags=flag)
-    surf.blit(img2, (0, 0), area=rect.move(-pos2), special_flags=flag)
-    return any(flatten(pygame.PixelArray(surf)))
+    offset1 = pos1[0] - rect.x, pos1[1] - rect.y
+    offset2 = pos2[0] - rect.x, pos2[1] - rect.y
+    area = get_area_mask(rect.size).overlap_mask(get_mask(img1), offset1)
+    return area.overlap(get_mask(img2), offset2) is not None
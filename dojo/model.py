@@ -1,8 +1,10 @@
 """Provide the model for the main game state."""
 
 # Imports
+from math import hypot
 from pygame import Rect, Color
-from mvctools import BaseModel, Dir, Timer, xytuple, from_gamedata, cursoredlist
+from mvctools import BaseModel, Dir, Timer, xytuple, xyvector
+from mvctools import from_gamedata, cursoredlist
 from mvctools.utils import CameraModel, EntryModel, MenuModel
 from dojo.common import perfect_collide
 from dojo.pause import PauseState
@@ -22,13 +24,19 @@ class DojoModel(CameraModel):
     display_scores = True
     display_controls = False
 
+    # Room model class, set below
+    room_class = None
+
+    # Snapshot (the room is replaced by a reset)
+    snapshot_fields = CameraModel.snapshot_fields + ("room",)
+
     def init(self):
         """Initialize camera and create the room model."""
         self.resource = self.control.resource
         self.size = self.resource.image.get(self.ref).get_size()
         self.room_rect = Rect((0, 0), self.size)
         self.init_camera(self.room_rect, self.speed)
-        self.room = RoomModel(self, self.room_rect)
+        self.room = self.room_class(self, self.room_rect)
 
     def pause(self, pause, callback):
         """Pause the game for a given time with a given callback."""
@@ -44,6 +52,10 @@ class DojoModel(CameraModel):
         """Forward actions to the room model."""
         return self.room.register(*args, **kwargs)
 
+    def resolve(self, action):
+        """Forward actions to the room model."""
+        return self.room.resolve(action)
+
 
 # Room model
 class RoomModel(BaseModel):
@@ -62,22 +74,45 @@ class RoomModel(BaseModel):
     # Speed ratio for slow motion
     slow_ratio = 0.2
 
+    # Only check the last step when the players are far apart
+    adaptive_steps = True
+
     # Title
     text = "Dojo"
 
+    # Player model class, set below
+    player_class = None
+
+    # Snapshot
+    snapshot_fields = BaseModel.snapshot_fields + \
+        ("colliding", "collision_count", "callback_data")
+
     def init(self, room_rect):
         """Initialize players and borders."""
         self.rect = room_rect
         self.size = self.rect.size
         self.border = BorderModel(self)
-        self.players = {i: PlayerModel(self, i) for i in (1, 2)}
+        self.players = {i: self.player_class(self, i) for i in (1, 2)}
         self.colliding = False
+        self.collision_count = 0
 
     @from_gamedata
     def score_dct(self):
         """Get the score from gamedata."""
         return {i: 0 for i in (1, 2)}
 
+    def dump_fields(self, buffer):
+        """Also save the scores."""
+        BaseModel.dump_fields(self, buffer)
+        buffer.append(self.score_dct[1])
+        buffer.append(self.score_dct[2])
+
+    def load_fields(self, buffer, index):
+        """Also restore the scores."""
+        index = BaseModel.load_fields(self, buffer, index)
+        self.score_dct[1], self.score_dct[2] = buffer[index:index+2]
+        return index + 2
+
     @property
     def display_controls(self):
         return self.parent.display_controls
@@ -109,11 +144,10 @@ class RoomModel(BaseModel):
     def register_start(self, down):
         """Register a reset from the controller."""
         if down and self.gameover:
-            state = type(self.state)
             if self.winner:
-                state = self.control.first_state
-            self.control.register_next_state(state)
-            return True
+                self.control.register_next_state(self.control.first_state)
+                return True
+            self.state.register_reset()
 
     def register_escape(self, down):
         """Register an escape from the controller."""
@@ -129,7 +163,10 @@ class RoomModel(BaseModel):
     def post_update(self):
         """Decompose players trajectory into steps."""
         maxi = max(len(self.players[pid].steps) for pid in (1, 2)) - 1
-        for i in range(maxi+1):
+        indexes = range(maxi+1)
+        if self.adaptive_steps and self.players_apart:
+            indexes = [maxi]
+        for i in indexes:
             for pid in (1, 2):
                 length = len(self.players[pid].steps) - 1
                 index = int(round(float(i*length)/maxi)) if maxi else 0
@@ -137,6 +174,19 @@ class RoomModel(BaseModel):
             if self.update_step():
                 break
 
+    @property
+    def players_apart(self):
+        """True if the players cannot get close during the current steps.
+
+        In this case, the intermediate steps can be skipped since
+        they cannot trigger a hit or the slow motion.
+        """
+        if self.colliding:
+            return False
+        p1, p2 = self.players[1], self.players[2]
+        margin = 2 * (self.threshold + len(p1.steps) + len(p2.steps))
+        return not p1.rect.inflate(margin, margin).colliderect(p2.rect)
+
     def update_step(self):
         """Update everything for the current step."""
         return self.update_speed() or self.update_hit() \
@@ -148,13 +198,12 @@ class RoomModel(BaseModel):
         lst = [float("inf")]
         for i in (1, 2):
             j = 2 if i == 1 else 1
-            pos_1 = xytuple(*self.players[i].legs.center)
-            if not any(pos_1):
+            x1, y1 = self.players[i].legs.center
+            if not x1 and not y1:
                 continue
-            pos_2 = xytuple(*self.players[j].head.center)
-            pos_3 = xytuple(*self.players[j].body.center)
-            lst.append(abs(pos_1-pos_2))
-            lst.append(abs(pos_1-pos_3))
+            for rect in (self.players[j].head, self.players[j].body):
+                x2, y2 = rect.center
+                lst.append(hypot(x1 - x2, y1 - y2))
         # Reset speed and camera
         if not self.colliding and min(lst) > float(self.threshold):
             if self.time_speed:
@@ -205,6 +254,7 @@ class RoomModel(BaseModel):
                     self.players[j].blinking_timer.start()
             # Pause
             self.colliding = True
+            self.collision_count += 1
             self.callback_data = hit
             pause = self.pause_dct[any(hit.values())]
             self.parent.pause(pause, self.callback)
@@ -237,6 +287,10 @@ class RoomModel(BaseModel):
                 self.players[j].blinking_timer.reset()
 
 
+# Default room model
+DojoModel.room_class = RoomModel
+
+
 # State entry model
 class StateEntryModel(EntryModel):
 
@@ -370,6 +424,11 @@ class PlayerModel(BaseModel):
     # Resource to get the player size
     ref = "player_1"
 
+    # Snapshot
+    snapshot_fields = BaseModel.snapshot_fields + \
+        ("rect", "old_rect", "steps", "speed", "remainder", "control_dir",
+         "save_dir", "pos", "fixed", "ko")
+
     def init(self, pid):
         """Initialize the player."""
         # Attributes
@@ -379,18 +438,21 @@ class PlayerModel(BaseModel):
         # Player rectangle
         self.size = self.resource.image.get(self.ref)[0].get_size()
         self.rect = Rect((0, 0), self.size)
+        self.hitbox_size = xytuple(*self.size) * ((self.hitbox_ratio,)*2)
         if pid == 1:
             self.rect.bottomleft = self.border.rect.bottomleft
         else:
             self.rect.bottomright = self.border.rect.bottomright
         # Player state
-        self.speed = self.remainder = xytuple(0.0, 0.0)
+        self.speed = xyvector(0.0, 0.0)
+        self.remainder = xyvector(0.0, 0.0)
         self.control_dir = Dir.NONE
         self.save_dir = Dir.NONE
         self.pos = Dir.DOWN
         self.fixed = True
         self.ko = False
         self.steps = [self.rect]
+        self.old_rect = self.rect
         # Animation timer
         self.timer = Timer(self,
                            stop=self.period,
@@ -448,6 +510,7 @@ class PlayerModel(BaseModel):
         """Knock the player out."""
         self.ko = True
         self.fixed = False
+        self.wake()
 
     def load(self):
         """Register a load action."""
@@ -527,9 +590,8 @@ class PlayerModel(BaseModel):
 
     def get_rect_from_dir(self, direction):
         """Compute a hitbox inside the player in a given direction."""
-        size = xytuple(*self.size) * ((self.hitbox_ratio,)*2)
         attr = Dir.DIR_TO_ATTR[direction]
-        rect = Rect((0, 0), size)
+        rect = Rect((0, 0), self.hitbox_size)
         value = getattr(self.rect, attr)
         setattr(rect, attr, value)
         return rect
@@ -557,25 +619,53 @@ class PlayerModel(BaseModel):
             return Rect(0, 0, 0, 0)
         return self.get_rect_from_dir(self.current_dir)
 
+    def is_idle(self):
+        """The player changes by itself while moving or loading a jump."""
+        speed = self.speed
+        if speed.x or speed.y or not self.fixed or self.prepared:
+            return False
+        return BaseModel.is_idle(self)
+
     def update(self):
-        """Update the player state."""
-        # Get acc
-        acc = -self.speed * self.air_friction
-        acc += self.gravity
+        """Update the player state.
+
+        The speed and the remainder are updated in place. A player
+        standing still on a wall sleeps until it loads a jump or gets
+        knocked out (the timers wake it up when they start).
+        """
+        delta = self.delta
+        speed, remainder = self.speed, self.remainder
+        # Save the position for the interpolation
+        self.old_rect = self.rect
         # Update speed
-        self.speed += self.delta_tuple * acc
         if self.fixed:
-            self.speed *= 0, 0
+            speed.set_ip(0.0, 0.0)
+        else:
+            (fx, fy), (gx, gy) = self.air_friction, self.gravity
+            speed.iadd_ip(delta * (gx - fx * speed.x),
+                          delta * (gy - fy * speed.y))
         # Get step
-        step = self.delta_tuple * self.speed
-        step += self.remainder
-        intstep = step.map(round)
-        self.remainder = step - intstep
+        x = delta * speed.x + remainder.x
+        y = delta * speed.y + remainder.y
+        intx, inty = round(x), round(y)
+        remainder.set_ip(x - intx, y - inty)
         # Register steps
-        args = Rect(self.rect), self.rect.move(intstep)
+        args = self.rect, self.rect.move(intx, inty)
         self.steps = list(Dir.generate_rects(*args))
         # Update timer
+        self.update_animation()
+        # Nothing changes until the next action
+        if self.fixed and not self.ko and not self.prepared and \
+           abs(remainder.x) < 0.5 and abs(remainder.y) < 0.5:
+            self.sleep()
+
+    def update_animation(self):
+        """Speed up the animation while loading a jump."""
         if self.loading:
             delta = self.load_factor_max - self.load_factor_min
             ratio = self.load_factor_min + self.loading_ratio * delta
             self.timer.start(ratio)
+
+
+# Default player model
+RoomModel.player_class = PlayerModel
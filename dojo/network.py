@@ -0,0 +1,111 @@
+"""Play a two players match over the network.
+
+The match is synchronized with rollbacks, or in lockstep with an input
+delay (see mvctools.network). The host plays the first player and the
+peer joining plays the second one.
+Both keyboard layouts control the local player. The escape key leaves
+the match, and the remote peer stops after a timeout.
+
+A latency, a jitter and a packet loss can be injected on both sides to
+try the rollbacks on a local network.
+
+Usage:
+
+    $ python -m dojo.network host --port 7777
+    $ python -m dojo.network join 127.0.0.1 --port 7777 --latency 0.05
+    $ python -m dojo.network join 127.0.0.1 --lockstep --delay 3
+"""
+
+# Imports
+import argparse
+
+# Imports from mvctools
+from mvctools.network import NetworkState, UDPTransport, network_state
+from mvctools.network import RollbackSession, LockstepSession
+from mvctools.spectator import SpectatorServer
+from mvctools.utils import PlayerAction
+
+# Imports from dojo
+from dojo import Dojo
+from dojo.controller import DojoController
+from dojo.state import TwoPlayersState
+from dojo.spectator import FORMATS, spectated_state
+
+
+# Network controller
+class NetworkController(DojoController):
+    """Dojo controller sending all the player actions as the local player.
+
+    The escape action stops the match instead of pausing it, since the
+    remote peer cannot be paused.
+    """
+
+    def register(self, action, arg, player=None, check=True):
+        """Remap the player actions to the local player."""
+        if action == PlayerAction.ESCAPE:
+            return arg
+        if player is not None:
+            player = self.state.local_player
+        return DojoController.register(self, action, arg, player, check)
+
+
+# Match state
+class MatchState(NetworkState, TwoPlayersState):
+    controller_class = NetworkController
+
+
+# Main function
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("mode", choices=("host", "join"))
+    parser.add_argument("address", nargs="?", default="",
+                        help="address of the host (join only)")
+    parser.add_argument("--port", type=int, default=7777,
+                        help="port of the host (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="injected latency in seconds (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="injected jitter in seconds (default: 0)")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="injected packet loss ratio (default: 0)")
+    parser.add_argument("--lockstep", action="store_true",
+                        help="use lockstep instead of rollbacks")
+    parser.add_argument("--delay", type=int, default=None,
+                        help="fixed input delay in ticks (lockstep only, "
+                        "adapted to the round trip time when omitted)")
+    parser.add_argument("--spectators", type=int, default=None,
+                        metavar="PORT", help="stream the match to the "
+                        "spectators on this port (see dojo.spectator)")
+    namespace = parser.parse_args(args)
+    injector = namespace.latency, namespace.jitter, namespace.loss
+    if namespace.mode == "host":
+        transport = UDPTransport(("", namespace.port), None, *injector)
+        players = 1, 2
+    else:
+        if not namespace.address:
+            parser.error("the address of the host is required")
+        peer = namespace.address, namespace.port
+        transport = UDPTransport(("", 0), peer, *injector)
+        players = 2, 1
+    session_class, options = RollbackSession, {}
+    if namespace.lockstep:
+        session_class = LockstepSession
+        if namespace.delay is not None:
+            options = {"input_delay": namespace.delay, "adaptive": False}
+    dojo = Dojo()
+    dojo.next_state = network_state(MatchState, transport, players[0],
+                                    players[1], session_class, **options)
+    server = None
+    if namespace.spectators is not None:
+        server = SpectatorServer(("", namespace.spectators), FORMATS)
+        dojo.next_state = spectated_state(dojo.next_state, server)
+    try:
+        dojo.run()
+    finally:
+        transport.close()
+        if server:
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
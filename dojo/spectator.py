@@ -0,0 +1,191 @@
+"""Stream a match to spectators.
+
+The server broadcasts the players, the scores and the camera of the
+match at every tick (see mvctools.spectator). A spectator displays them
+with the dojo view, without running the physics. The escape key stops
+watching. A network match can also be streamed with the **--spectators**
+option of dojo.network.
+
+Usage:
+
+    $ python -m dojo.spectator serve --port 7778
+    $ python -m dojo.spectator watch 127.0.0.1 --port 7778
+"""
+
+# Imports
+import argparse
+from pygame import Rect
+
+# Imports from mvctools
+from mvctools import BaseState, Dir
+from mvctools.spectator import SpectatorServer, SpectatorClient
+
+# Imports from dojo
+from dojo import Dojo
+from dojo.controller import DojoController
+from dojo.view import DojoView
+from dojo.model import DojoModel, RoomModel, PlayerModel
+from dojo.state import TwoPlayersState
+
+
+# Streamed fields
+PLAYER_FORMATS = "hhBBB"
+FORMATS = PLAYER_FORMATS * 2 + "BBB" + "hhhh"
+DIR_INDEX = {direction: index for index, direction in enumerate(Dir.DIRS)}
+
+# Player flags
+FIXED, KO, LOADING, BLINKING = 1, 2, 4, 8
+
+
+def get_fields(model):
+    """Return the streamed fields of a dojo model.
+
+    For each player: position, flags, directions and loading ratio.
+    Then the collision flag, the scores and the camera rectangle.
+    """
+    room = model.room
+    values = []
+    for pid in (1, 2):
+        player = room.players[pid]
+        flags = (FIXED * player.fixed | KO * player.ko |
+                 LOADING * player.loading |
+                 BLINKING * (not player.blinking_timer.is_paused))
+        dirs = DIR_INDEX[player.pos] | DIR_INDEX[player.current_dir] << 4
+        ratio = min(max(int(round(255 * player.loading_ratio)), 0), 255)
+        values += [player.rect.x, player.rect.y, flags, dirs, ratio]
+    values += [room.colliding, min(room.score_dct[1], 255),
+               min(room.score_dct[2], 255)]
+    values += list(model.camera_rect)
+    return values
+
+
+# Spectator models
+class SpectatorPlayerModel(PlayerModel):
+    """Player set by the streamed fields, without physics."""
+
+    current_dir = Dir.NONE
+    loading = False
+    loading_ratio = 0.0
+
+    def apply(self, values):
+        """Apply the streamed fields of the player."""
+        x, y, flags, dirs, ratio = values
+        self.rect = Rect((x, y), self.size)
+        self.fixed = bool(flags & FIXED)
+        self.ko = bool(flags & KO)
+        self.loading = bool(flags & LOADING)
+        self.pos = Dir.DIRS[dirs & 15]
+        self.current_dir = Dir.DIRS[dirs >> 4]
+        self.loading_ratio = ratio / 255.0
+        # Blinking
+        blinking = bool(flags & BLINKING)
+        if blinking and self.blinking_timer.is_paused:
+            self.blinking_timer.start()
+        elif not blinking and not self.blinking_timer.is_paused:
+            self.blinking_timer.reset()
+
+    def update(self):
+        """Only update the animation."""
+        self.update_animation()
+
+
+class SpectatorRoomModel(RoomModel):
+    """Room without physics."""
+
+    player_class = SpectatorPlayerModel
+
+    def post_update(self):
+        pass
+
+
+class SpectatorModel(DojoModel):
+    """Dojo model set by the fields received from the server."""
+
+    room_class = SpectatorRoomModel
+
+    def update(self):
+        """Apply the last fields received."""
+        room = self.room
+        for player in room.players.values():
+            player.old_rect = player.rect
+        self.old_camera_rect = self.camera_rect
+        values = self.state.client.receive()
+        if values is None:
+            return
+        size = len(PLAYER_FORMATS)
+        for index, pid in enumerate((1, 2)):
+            room.players[pid].apply(values[index*size:(index+1)*size])
+        room.colliding = bool(values[2*size])
+        room.score_dct[1], room.score_dct[2] = values[2*size+1:2*size+3]
+        self.camera_rect = Rect(values[2*size+3:])
+
+    def post_update(self):
+        """The camera is streamed."""
+        pass
+
+    def is_idle(self):
+        return False
+
+    def register(self, action, *args, **kwargs):
+        """Stop watching on escape."""
+        if action == "escape":
+            return args[0]
+
+
+# Spectator state
+class SpectatorState(BaseState):
+    """State displaying a match streamed by a server.
+
+    The **client** class attribute is the SpectatorClient to use.
+    """
+    model_class = SpectatorModel
+    controller_class = DojoController
+    view_class = DojoView
+    client = None
+
+
+# Server state factory
+def spectated_state(state_class, server):
+    """Build a state class broadcasting its model after each update.
+
+    Args:
+        state_class (type): state with a dojo model
+        server (SpectatorServer): the server to broadcast to
+    """
+    def update_model(self):
+        try:
+            return state_class.update_model(self)
+        finally:
+            server.broadcast(self.tick_count, get_fields(self.model))
+    attrs = {"update_model": update_model}
+    return type("Spectated" + state_class.__name__, (state_class,), attrs)
+
+
+# Main function
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("mode", choices=("serve", "watch"))
+    parser.add_argument("address", nargs="?", default="",
+                        help="address of the server (watch only)")
+    parser.add_argument("--port", type=int, default=7778,
+                        help="port of the server (default: %(default)s)")
+    namespace = parser.parse_args(args)
+    dojo = Dojo()
+    if namespace.mode == "serve":
+        connection = SpectatorServer(("", namespace.port), FORMATS)
+        dojo.next_state = spectated_state(TwoPlayersState, connection)
+    else:
+        if not namespace.address:
+            parser.error("the address of the server is required")
+        server = namespace.address, namespace.port
+        connection = SpectatorClient(server, FORMATS)
+        dojo.next_state = type("SpectatorState", (SpectatorState,),
+                               {"client": connection})
+    try:
+        dojo.run()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
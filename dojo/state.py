@@ -4,7 +4,7 @@
 from random import choice, expovariate
 
 # Imports from mvctools
-from mvctools import BaseState, Dir, NextStateException, Timer, from_gamedata
+from mvctools import BaseState, Dir, Timer, from_gamedata
 
 # Imports from dojo
 from dojo.controller import DojoController
@@ -12,35 +12,22 @@ from dojo.view import DojoView
 from dojo.model import DojoModel, TitleMenuModel, SettingsMenuModel
 
 
-# No player model
-class NoPlayerModel(DojoModel):
+# AI model
+class AIModel(DojoModel):
+    """Dojo model with some of the players driven by a random AI."""
 
-    display_scores = False
-    display_controls = False
-    ai_speed = 1
+    ai_players = ()
+    ai_speed = 3
 
     def init(self):
         DojoModel.init(self)
-        self.reset_timer = Timer(self, stop=3, callback=self.reset)
-        self.start_timer = Timer(self, stop=3).start()
-        for i in (1, 2):
-            self.room.players[i].jump_timer = None
+        for pid in self.ai_players:
+            self.room.players[pid].jump_timer = None
 
-    def post_update(self):
-        """Set up AI for both players and disable bullet time.
-        """
-        # Wait for start signal
-        if not self.start_timer.is_set:
-            return
-        # Disable bullet time
-        if self.room.time_speed:
-            self.room.time_speed = 1.0
-        # Wait if gameover
-        if self.room.gameover:
-            self.reset_timer.start()
-            return
-        # IA
-        for player in self.room.players.values():
+    def update_ai(self):
+        """Load, pick a direction and delay a jump for the AI players."""
+        for pid in self.ai_players:
+            player = self.room.players[pid]
             # Load
             if player.fixed and not player.prepared:
                 player.load()
@@ -57,15 +44,60 @@ class NoPlayerModel(DojoModel):
             if not player.fixed:
                 player.register_dir(Dir.NONE)
 
+    def dump_fields(self, buffer):
+        """Also save the jump timers of the AI players."""
+        DojoModel.dump_fields(self, buffer)
+        for pid in self.ai_players:
+            buffer.append(self.room.players[pid].jump_timer)
+
+    def load_fields(self, buffer, index):
+        """Also restore the jump timers of the AI players."""
+        index = DojoModel.load_fields(self, buffer, index)
+        for pid in self.ai_players:
+            self.room.players[pid].jump_timer = buffer[index]
+            index += 1
+        return index
+
     def gen_callback(self, player):
         def callback(self, arg=None):
             player.jump()
             player.jump_timer = None
         return callback
 
+
+# No player model
+class NoPlayerModel(AIModel):
+
+    display_scores = False
+    display_controls = False
+    ai_players = 1, 2
+    ai_speed = 1
+    snapshot_fields = AIModel.snapshot_fields + \
+        ("reset_timer", "start_timer")
+
+    def init(self):
+        AIModel.init(self)
+        self.reset_timer = Timer(self, stop=3, callback=self.reset)
+        self.start_timer = Timer(self, stop=3).start()
+
+    def post_update(self):
+        """Set up AI for both players and disable bullet time.
+        """
+        # Wait for start signal
+        if not self.start_timer.is_set:
+            return
+        # Disable bullet time
+        if self.room.time_speed:
+            self.room.time_speed = 1.0
+        # Wait if gameover
+        if self.room.gameover:
+            self.reset_timer.start()
+            return
+        # IA
+        self.update_ai()
+
     def reset(self, arg=None):
-        self.control.register_next_state(type(self.state))
-        raise NextStateException
+        self.state.register_reset()
 
 
 # Title Screen Model
@@ -83,6 +115,10 @@ class DojoMainModel(NoPlayerModel):
         """Forward action to the menu."""
         return self.menu.register(*args, **kwargs)
 
+    def resolve(self, action):
+        """Forward action to the menu."""
+        return self.menu.resolve(action)
+
 
 # Info Model
 class InfoModel(DojoModel):
@@ -110,6 +146,7 @@ class SettingsModel(DojoModel):
 
     display_controls = False
     display_scores = False
+    snapshot_fields = DojoModel.snapshot_fields + ("menu",)
 
     def init(self):
         DojoModel.init(self)
@@ -119,15 +156,15 @@ class SettingsModel(DojoModel):
         """Forward action to the menu."""
         return self.menu.register(*args, **kwargs)
 
+    def resolve(self, action):
+        """Forward action to the menu."""
+        return self.menu.resolve(action)
+
 
 # One Player Model
-class OnePlayerModel(DojoModel):
-
-    ai_speed = 3
+class OnePlayerModel(AIModel):
 
-    def init(self):
-        DojoModel.init(self)
-        self.room.players[2].jump_timer = None
+    ai_players = 2,
 
     def register(self, action, arg, player=None):
         """Escape to pass and remap player 2 events on player 1."""
@@ -141,28 +178,8 @@ class OnePlayerModel(DojoModel):
         # Wait if gameover
         if self.room.gameover:
             return
-        # Load
-        player = self.room.players[2]
-        if player.fixed and not player.prepared:
-            player.load()
-        # Pick a direction
-        if player.fixed and not any(player.current_dir):
-            player.register_dir(choice(Dir.DIRS))
-        # Delay a jump
-        if player.fixed and player.prepared and not player.jump_timer:
-            player.jump_timer = Timer(self,
-                                      stop=expovariate(self.ai_speed),
-                                      callback=self.gen_callback(player)
-                                      ).start()
-        # Reset direction
-        if not player.fixed:
-            player.register_dir(Dir.NONE)
-
-    def gen_callback(self, player):
-        def callback(self, arg=None):
-            player.jump()
-            player.jump_timer = None
-        return callback
+        # IA
+        self.update_ai()
 
 
 # Informative state
@@ -1,18 +1,22 @@
 """Provide the view for the main game state."""
 
+# Imports
+from itertools import product
+
 # Pygame imports
 import pygame as pg
 from pygame import Surface, transform, draw
 
 # MVC tools imports
 from mvctools import BaseView, AutoSprite, Dir, xytuple
+from mvctools.common import interpolate_rect
 from mvctools.utils import TextSprite, MenuSprite
 from mvctools.utils import CameraSprite
 
 # Dojo imports
 from dojo.model import PlayerModel, RectModel, RoomModel, TitleMenuModel
 from dojo.model import SettingsMenuModel
-from dojo.common import opacify_ip, flash
+from dojo.common import opacify_ip, flash, get_mask
 
 
 # Settings for text sprites
@@ -159,6 +163,7 @@ class AuraSprite(AutoSprite):
     """Aura sprite."""
 
     opacity = 1
+    atlas_name = "aura"
 
     perp_name = "aura/aura_perp"
     diag_name = "aura/aura_diag"
@@ -168,7 +173,11 @@ class AuraSprite(AutoSprite):
 
     def init(self):
         """Initialize the resources."""
-        self.resource_dct = self.generate_resource_dct()
+        sources = ["image/" + name for name in (self.perp_name,
+                                                self.diag_name)]
+        atlas = self.build_atlas(self.atlas_name, self.generate_variants,
+                                 sources, {"opacity": self.opacity})
+        self.resource_dct = self.generate_resource_dct(atlas)
         self.layer = self.parent.layer + 10
 
     def get_image(self):
@@ -179,24 +188,31 @@ class AuraSprite(AutoSprite):
     def get_rect(self):
         """Get the corresponding rectangle."""
         attr = Dir.DIR_TO_ATTR[self.model.current_dir]
-        center = getattr(self.model.rect, attr)
+        center = getattr(self.parent.rect, attr)
         return self.image.get_rect(center=center)
 
-    def generate_resource_dct(self):
-        """Genrerate animations with rotations and flipping."""
-        dct = {Dir.NONE: None}
+    def generate_variants(self):
+        """Genrerate the images with rotations for the atlas."""
+        images = {}
         # Raw
         diag_image = self.resource.image.get(self.diag_name)
         perp_image = self.resource.image.get(self.perp_name)
         # Rotate
         for r in range(4):
-            dct[self.perp_dir[r]] = transform.rotate(perp_image, 90*r)
-            dct[self.diag_dir[r]] = transform.rotate(diag_image, 90*r)
+            images[self.perp_dir[r]] = transform.rotate(perp_image, 90*r)
+            images[self.diag_dir[r]] = transform.rotate(diag_image, 90*r)
         # Opacify
-        for image in dct.values():
-            if image:
-                opacify_ip(image, self.opacity)
+        for image in images.values():
+            opacify_ip(image, self.opacity)
         # Return
+        return {("aura",) + tuple(direction): image
+                for direction, image in images.items()}
+
+    def generate_resource_dct(self, atlas):
+        """Get the images of each direction from the atlas."""
+        dct = {Dir.NONE: None}
+        for direction in self.perp_dir + self.diag_dir:
+            dct[direction] = atlas[("aura",) + tuple(direction)]
         return dct
 
 
@@ -232,25 +248,38 @@ class PlayerSprite(AutoSprite):
 
     def init(self):
         """Initialize the resources."""
-        # Animation
+        # Atlas
         self.layer = 10
-        timer = self.model.timer
-        filename = self.player_dct[self.model.id]
-        resource = self.resource.image.get(filename)
-        self.resource_dct = self.generate_animation_dct(resource, timer)
+        pid = self.model.id
+        builder = lambda: self.generate_variants(pid)
+        sources = ["image/" + name for name in (self.player_dct[pid],
+                                                self.perp_names[pid],
+                                                self.diag_names[pid])]
+        self.atlas = self.build_atlas(self.player_dct[pid], builder,
+                                      sources)
+        # Animation
+        self.resource_dct = self.generate_animation_dct(self.model.timer)
         # Jumping
-        self.jumping_dct = self.generate_jumping_dct(self.model.id)
+        self.jumping_dct = self.generate_jumping_dct()
         # KO
-        filename = self.ko_dct[self.model.id]
+        filename = self.ko_dct[pid]
         self.ko = self.resource.image.get(filename)
+        # Collision masks
+        self.generate_masks()
         # Aura
         self.aura = AuraSprite(self)
 
     def get_image(self):
         """Return the current image to use."""
         # Blinking
-        value = self.model.blinking_timer.get(normalized=True)
+        timer = self.model.blinking_timer
+        value = timer.get(normalized=True)
         self.visible = not round(value)
+        start, stop = timer.interval
+        target = (start + stop) / 2.0 if value < 0.5 else stop
+        delay = timer.get_delay(target)
+        if delay is not None:
+            self.state.register_redraw(delay)
         # KO
         if self.model.ko:
             return self.ko
@@ -263,14 +292,30 @@ class PlayerSprite(AutoSprite):
         return self.jumping_dct.get(self.model.current_dir, self.image)
 
     def get_rect(self):
-        """Return the current rect to use."""
-        return self.model.rect
+        """Return the current rect to use.
+
+        It is interpolated between the last two simulation ticks.
+        """
+        ratio = self.state.interpolation
+        return interpolate_rect(self.model.old_rect, self.model.rect, ratio)
 
     def get_layer(self):
         """Return the current layer."""
         return not self.model.fixed
 
-    def generate_jumping_dct(self, pid):
+    def generate_variants(self, pid):
+        """Generate all the images of a player for the atlas."""
+        images = {}
+        filename = self.player_dct[pid]
+        resource = self.resource.image.get(filename)
+        for key, lst in self.generate_animation_images(resource):
+            for i, image in enumerate(lst):
+                images[("animation",) + key + (i,)] = image
+        for direction, image in self.generate_jumping_images(pid).items():
+            images[("jumping",) + tuple(direction)] = image
+        return images
+
+    def generate_jumping_images(self, pid):
         """Genrerate animations with rotations and flipping."""
         dct = {}
         # Raw
@@ -289,9 +334,8 @@ class PlayerSprite(AutoSprite):
         # Return
         return dct
 
-    def generate_animation_dct(self, resource, timer):
+    def generate_animation_images(self, resource):
         """Genrerate animations with rotations and flipping."""
-        dct = {}
         for h in range(2):
             for v in range(2):
                 for r in range(4):
@@ -301,8 +345,27 @@ class PlayerSprite(AutoSprite):
                         if l:
                             lst = [flash(image, not i/2)
                                    for i, image in enumerate(lst)]
-                        key = h, v, r, l
-                        dct[key] = self.build_animation(lst, timer=timer)
+                        yield (h, v, r, l), lst
+
+    def generate_jumping_dct(self):
+        """Get the jumping images from the atlas."""
+        return {direction: self.atlas[("jumping",) + tuple(direction)]
+                for direction in self.perp_dir + self.diag_dir}
+
+    def generate_masks(self):
+        """Precompute the collision masks of all the variants."""
+        images = [self.ko] + list(self.jumping_dct.values())
+        for animation in self.resource_dct.values():
+            images.extend(animation.resource)
+        for image in images:
+            get_mask(image)
+
+    def generate_animation_dct(self, timer):
+        """Build the animations from the atlas."""
+        dct = {}
+        for key in product(range(2), range(2), range(4), range(2)):
+            lst = self.atlas.sequence("animation", *key)
+            dct[key] = self.build_animation(lst, timer=timer)
         return dct
 
 
@@ -6,7 +6,7 @@ classes are provided. Other high level features are available, like the
 resource handler and automatically updated sprite.
 """
 
-from mvctools.common import Dir, xytuple, cursoredlist
+from mvctools.common import Dir, xytuple, xyvector, cursoredlist
 from mvctools.control import BaseControl
 from mvctools.state import BaseState, NextStateException
 from mvctools.controller import BaseController, MouseController
@@ -15,6 +15,9 @@ from mvctools.property import from_gamedata, setting, default_setting
 from mvctools.view import BaseView
 from mvctools.settings import BaseSettings
 from mvctools.gamedata import BaseGamedata
+from mvctools.replay import ReplayController, replay_state, replay
+from mvctools.timing import FrameTimer, Pacer
+from mvctools.atlas import SpriteAtlas
 from mvctools.sprite import AutoSprite, Animation
 
 
@@ -0,0 +1,188 @@
+"""Module to pack precomputed image variants into a single surface.
+
+An atlas is built once from a dictionary of surfaces, then the variants
+are looked up as subsurfaces of the packed surface. The atlases are
+shared between the states through the resource handler cache, and can
+optionally be saved to a directory to skip the building step at the
+next start. A saved atlas is rebuilt when its source files (modification
+time and size) or its variant parameters change.
+"""
+
+# Imports
+import os
+import json
+import pygame as pg
+from pygame import Rect, Surface
+
+
+# Atlas format
+VERSION = 1
+
+
+# Key conversion
+def to_key(value):
+    """Convert a decoded JSON key back to a tuple."""
+    if isinstance(value, list):
+        return tuple(to_key(item) for item in value)
+    return value
+
+
+# Signature
+def get_signature(sources=(), params=None):
+    """Return the signature of an atlas, as saved in its index.
+
+    Args:
+        sources (list): paths of the source files or directories
+        params: JSON serializable parameters of the variants
+    """
+    files = []
+    for path in filter(None, sources):
+        base = os.path.dirname(path)
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend((base, os.path.join(root, name))
+                             for name in names)
+        elif os.path.isfile(path):
+            files.append((base, path))
+    # The paths are saved relative to the parent of their source
+    stats = sorted([os.path.relpath(path, base), os.path.getmtime(path),
+                    os.path.getsize(path)] for base, path in files)
+    # Normalize the types as in the saved index
+    return json.loads(json.dumps({"sources": stats, "params": params}))
+
+
+# Sprite atlas
+class SpriteAtlas(object):
+    """Packed surface with the subsurfaces of its variants.
+
+    Args:
+        surface (Surface): packed surface
+        rects (dict): rectangle of each variant in the surface
+
+    The keys are tuples of strings and integers, so they can be saved.
+    """
+
+    #: Maximum width of the packed surface
+    max_width = 1024
+
+    def __init__(self, surface, rects):
+        """Create the subsurfaces."""
+        self.surface = surface
+        self.rects = rects
+        self.images = {key: surface.subsurface(rect)
+                       for key, rect in rects.items()}
+
+    @classmethod
+    def from_images(cls, images):
+        """Pack a dictionary of surfaces into an atlas.
+
+        The surfaces are sorted by height and placed on shelves.
+        The pixels are copied without blending.
+        """
+        rects, x, y, shelf = {}, 0, 0, 0
+        order = sorted(images, key=lambda k: (-images[k].get_height(), k))
+        for key in order:
+            width, height = images[key].get_size()
+            if x and x + width > cls.max_width:
+                x, y, shelf = 0, y + shelf, 0
+            rects[key] = Rect((x, y), (width, height))
+            x, shelf = x + width, max(shelf, height)
+        size = max([rect.right for rect in rects.values()] + [1]), y + shelf
+        surface = cls.create_surface(size)
+        for key, rect in rects.items():
+            surface.blit(images[key], rect, special_flags=pg.BLEND_RGBA_MAX)
+        return cls(surface, rects)
+
+    @staticmethod
+    def create_surface(size):
+        """Create an empty surface with per-pixel alpha."""
+        surface = Surface(size, pg.SRCALPHA, 32)
+        if pg.display.get_surface():
+            surface = surface.convert_alpha()
+        surface.fill((0, 0, 0, 0))
+        return surface
+
+    # Lookup
+
+    def get(self, key, default=None):
+        """Return the subsurface of a variant."""
+        return self.images.get(key, default)
+
+    def sequence(self, *prefix):
+        """Return the list of variants with keys prefix + (0,), (1,), etc."""
+        result = []
+        while prefix + (len(result),) in self.images:
+            result.append(self.images[prefix + (len(result),)])
+        return result
+
+    def __getitem__(self, key):
+        return self.images[key]
+
+    def __contains__(self, key):
+        return key in self.images
+
+    def __len__(self):
+        return len(self.images)
+
+    # Serialization
+
+    def save(self, path, signature=None):
+        """Save the atlas as path.png and path.json, with the signature
+        returned by **get_signature**."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        pg.image.save(self.surface, path + ".png")
+        rects = [[key, list(rect)] for key, rect in sorted(self.rects.items())]
+        with open(path + ".json", "w") as index_file:
+            json.dump({"version": VERSION, "signature": signature,
+                       "rects": rects}, index_file)
+
+    @classmethod
+    def load(cls, path, signature=None):
+        """Load an atlas saved with the save method.
+
+        Return None if the files are missing, use another version or
+        were saved with another signature.
+        """
+        if not os.path.isfile(path + ".json"):
+            return None
+        with open(path + ".json") as index_file:
+            index = json.load(index_file)
+        if index.get("version") != VERSION or \
+           index.get("signature") != signature:
+            return None
+        rects = {to_key(key): Rect(rect) for key, rect in index["rects"]}
+        surface = pg.image.load(path + ".png")
+        if pg.display.get_surface():
+            surface = surface.convert_alpha()
+        return cls(surface, rects)
+
+
+# Atlas getter
+def get_atlas(resource, name, builder, directory="", sources=(),
+              params=None):
+    """Return the atlas of the given name.
+
+    Args:
+        resource (ResourceHandler): handler used to cache the atlas
+        name (str): name of the atlas
+        builder (callable): return the dictionary of surfaces to pack
+        directory (str): where to save and load the atlas (optional)
+        sources (list): paths of the source files or directories
+        params: JSON serializable parameters of the variants
+
+    The atlas is built once and cached by the resource handler.
+    If a directory is given, the atlas is loaded from it when available
+    with the same sources and parameters, and saved to it otherwise.
+    """
+    def build():
+        path = os.path.join(directory, name) if directory else None
+        signature = get_signature(sources, params) if path else None
+        atlas = SpriteAtlas.load(path, signature) if path else None
+        if atlas is None:
+            atlas = SpriteAtlas.from_images(builder())
+            if path:
+                atlas.save(path, signature)
+        return atlas
+    return resource.getcache(("atlas", name), build)
@@ -2,7 +2,8 @@
 
 # Imports
 import operator
-from math import ceil
+from math import ceil, hypot
+from numbers import Real
 from fractions import gcd
 from functools import wraps
 from weakref import WeakKeyDictionary
@@ -60,6 +61,185 @@ class xytuple(namedtuple("xytuple",("x","y"))):
                       """
 
 
+# XY vector
+class xyvector(object):
+    """Mutable and slotted vector for x,y coordinates.
+
+    It is meant to replace xytuple in the hot paths. The API is the same:
+    indexing, unpacking, comparison, term-to-term operators, abs and map.
+    The regular operators return a new xyvector, while the inplace operators
+    modify the vector itself. Unlike xytuple, it is not hashable.
+
+    The following methods work in place and do not allocate anything:
+     - **set_ip**: set the coordinates
+     - **iadd_ip**: add the given coordinates
+     - **isub_ip**: substract the given coordinates
+     - **scale_ip**: multiply by the given coordinates
+
+    They all accept either two numbers, a single number (applied to
+    both coordinates) or a two-elements iterable. Numbers and xyvector
+    arguments use a fast path.
+    """
+
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y=None):
+        """Initialize the vector from two numbers or an iterable."""
+        if y is None:
+            x, y = x
+        self.x = x
+        self.y = y
+
+    # Argument helper
+
+    @staticmethod
+    def _unpack(x, y):
+        """Return a (x, y) tuple for the given arguments."""
+        if y is not None:
+            return x, y
+        if type(x) in (float, int) or isinstance(x, Real):
+            return x, x
+        if type(x) is xyvector:
+            return x.x, x.y
+        return tuple(x)
+
+    # Inplace methods
+
+    def set_ip(self, x, y=None):
+        """Set the coordinates in place and return the vector."""
+        self.x, self.y = self._unpack(x, y)
+        return self
+
+    def iadd_ip(self, x, y=None):
+        """Add the given coordinates in place and return the vector."""
+        x, y = self._unpack(x, y)
+        self.x += x
+        self.y += y
+        return self
+
+    def isub_ip(self, x, y=None):
+        """Substract the given coordinates in place and return the vector."""
+        x, y = self._unpack(x, y)
+        self.x -= x
+        self.y -= y
+        return self
+
+    def scale_ip(self, x, y=None):
+        """Multiply by the given coordinates in place and return the vector.
+        """
+        x, y = self._unpack(x, y)
+        self.x *= x
+        self.y *= y
+        return self
+
+    # Conversion
+
+    def copy(self):
+        """Return a copy of the vector."""
+        return xyvector(self.x, self.y)
+
+    def map(self, func, *args):
+        """Map the coordinates with the given function a return an xyvector.
+        """
+        return xyvector(*map(func, self, *args))
+
+    # Sequence interface
+
+    def __len__(self):
+        return 2
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __getitem__(self, index):
+        return (self.x, self.y)[index]
+
+    def __eq__(self, other):
+        try:
+            return (self.x, self.y) == tuple(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def _compare(self, other, op):
+        """Compare as tuples, like xytuple."""
+        try:
+            return op((self.x, self.y), tuple(other))
+        except TypeError:
+            return NotImplemented
+
+    def __lt__(self, other):
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._compare(other, operator.ge)
+
+    __hash__ = None
+
+    def __nonzero__(self):
+        return bool(self.x or self.y)
+
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        return "xyvector(x={0!r}, y={1!r})".format(self.x, self.y)
+
+    # Operators
+
+    def __add__(self, it):
+        """Add a 2-elements iterable and return an xyvector."""
+        return self.copy().iadd_ip(it)
+
+    def __sub__(self, it):
+        """Substract a 2-elements iterable and return an xyvector."""
+        return self.copy().isub_ip(it)
+
+    def __mul__(self, it):
+        """Product by a 2-elements iterable and return an xyvector."""
+        return self.copy().scale_ip(it)
+
+    def __div__(self, it):
+        """Divide by a 2-elements iterable and return an xyvector."""
+        x, y = self._unpack(it, None)
+        return xyvector(self.x / x, self.y / y)
+
+    __truediv__ = __div__
+
+    def __iadd__(self, it):
+        return self.iadd_ip(it)
+
+    def __isub__(self, it):
+        return self.isub_ip(it)
+
+    def __imul__(self, it):
+        return self.scale_ip(it)
+
+    def __idiv__(self, it):
+        x, y = self._unpack(it, None)
+        self.x /= x
+        self.y /= y
+        return self
+
+    __itruediv__ = __idiv__
+
+    def __neg__(self):
+        """Return the additive inverse of an xyvector."""
+        return xyvector(-self.x, -self.y)
+
+    def __abs__(self):
+        """Return a float, the norm of the coordinates."""
+        return hypot(self.x, self.y)
+
+
 # Direction enumeration
 class Dir:
 
@@ -96,6 +276,9 @@ class Dir:
     NORMALIZED_DIRS = [direct/(2*(abs(direct),))
                        for direct in DIRS if any(direct)]
 
+    #: Integer coordinates to direction
+    STEP_DCT = {tuple(direct): direct for direct in DIRS}
+
     # Class methods
 
     @classmethod
@@ -107,6 +290,9 @@ class Dir:
 
         By default, the NONE direction is excluded from the results.
         """
+        x, y = vector
+        if normalized and not include_none and (x or y):
+            return cls.closest_step(x, y)
         dirs = cls.NORMALIZED_DIRS if normalized else cls.DIRS
         _, direct = min((abs(direct - vector), direct) for direct in dirs
                         if include_none or any(direct))
@@ -114,16 +300,53 @@ class Dir:
             return direct
         return direct.map(round).map(int)
 
+    @classmethod
+    def closest_step(cls, x, y):
+        """Return the closest normalized direction to a non-null vector.
+
+        The test does not compute any distance: the diagonal is the
+        closest direction if (a+b)**2 > 2*a**2, where a and b are the
+        largest and the smallest absolute coordinates.
+        """
+        ax, ay = abs(x), abs(y)
+        a, b = (ax, ay) if ax > ay else (ay, ax)
+        sx = (x > 0) - (x < 0)
+        sy = (y > 0) - (y < 0)
+        # Diagonal
+        if (a + b) * (a + b) > 2 * a * a:
+            return cls.STEP_DCT[sx, sy]
+        # Horizontal
+        if ax > ay:
+            return cls.STEP_DCT[sx, 0]
+        # Vertical
+        return cls.STEP_DCT[0, sy]
+
     # Class generators
 
+    @classmethod
+    def generate_directions(cls, old, new):
+        """Generate all the directions to go from one integer position
+        to another.
+
+        It gives the same path as picking the closest normalized direction
+        at each step, but the test is performed on integers (see
+        closest_step).
+        """
+        dx, dy = new[0] - old[0], new[1] - old[1]
+        closest_step = cls.closest_step
+        while dx or dy:
+            step = closest_step(dx, dy)
+            dx -= step.x
+            dy -= step.y
+            yield step
+
     @classmethod
     def generate_steps(cls, old, new):
         """Generate all the directions to go from one position
         to another.
         """
-        new, current = xytuple(new), xytuple(old)
-        while current != new:
-            step = cls.closest_dir(new - current)
+        current = xytuple(old)
+        for step in cls.generate_directions(old, new):
             current += step
             yield step, current
 
@@ -142,10 +365,11 @@ class Dir:
         one rectangle to another. They're both included.
         However, all rectangles have the first rectangle size.
         """
-        for position in cls.generate_positions(old.center, new.center):
-            copy = old.copy()
-            copy.center = position
-            yield copy
+        rect = old.copy()
+        yield rect
+        for x, y in cls.generate_directions(old.center, new.center):
+            rect = rect.move(x, y)
+            yield rect
 
 
 # Cursored list
@@ -243,6 +467,83 @@ def update_rect_list(rect, lst, clip):
     lst.append(rect.clip(clip))
 
 
+# Interpolate rectangles function
+def interpolate_rect(old, new, ratio):
+    """Return a rectangle between two positions of a rectangle.
+
+    The ratio is between 0 (old position) and 1 (new position).
+    The four edges are interpolated, so the size changes smoothly too.
+    """
+    if ratio >= 1 or old is None or old == new:
+        return new
+    left, top, right, bottom = (
+        int(round(a + (b - a) * ratio)) for a, b in
+        zip((old.left, old.top, old.right, old.bottom),
+            (new.left, new.top, new.right, new.bottom)))
+    return Rect(left, top, right - left, bottom - top)
+
+
+# Spatial grid
+class SpatialGrid(object):
+    """Uniform grid indexing objects by their rectangle.
+
+    Args:
+        cell_size (int): size of the square cells in pixels
+
+    The objects are only moved between the cells when their rectangle
+    changes. Empty rectangles are not indexed.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.rects = {}
+
+    def get_cells(self, rect):
+        """Return the cells covered by a rectangle."""
+        if not rect:
+            return ()
+        size = self.cell_size
+        xs = range(int(rect.left // size), int((rect.right-1) // size) + 1)
+        ys = range(int(rect.top // size), int((rect.bottom-1) // size) + 1)
+        return [(x, y) for x in xs for y in ys]
+
+    def set(self, obj, rect):
+        """Index an object with a given rectangle."""
+        old = self.rects.get(obj)
+        if old == rect:
+            return
+        if old is not None:
+            self._remove_cells(obj, old)
+        self.rects[obj] = Rect(rect)
+        for cell in self.get_cells(rect):
+            self.cells[cell].add(obj)
+
+    def discard(self, obj):
+        """Remove an object from the grid if indexed."""
+        old = self.rects.pop(obj, None)
+        if old is not None:
+            self._remove_cells(obj, old)
+
+    def update(self, rect_dct):
+        """Index the objects of an (object, rectangle) dictionary."""
+        for obj, rect in rect_dct.items():
+            self.set(obj, rect)
+
+    def query(self, pos):
+        """Return the set of objects whose rectangle contains a point."""
+        cell = int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+        return {obj for obj in self.cells.get(cell, ())
+                if self.rects[obj].collidepoint(pos)}
+
+    def _remove_cells(self, obj, rect):
+        for cell in self.get_cells(rect):
+            objs = self.cells[cell]
+            objs.discard(obj)
+            if not objs:
+                del self.cells[cell]
+
+
 # Cache dictionary
 class cachedict(defaultdict):
 
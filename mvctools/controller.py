@@ -3,6 +3,7 @@
 # Imports
 import pygame as pg
 from mvctools.common import xytuple
+from mvctools.model import overrides
 
 
 # Base controller class
@@ -15,6 +16,8 @@ class BaseController(object):
     A subclass of BaseController may override the following method:
      - **init**: called at initialization
        (default: do nothing)
+     - **reset**: called when the state is reset in place
+       (default: do nothing)
      - **is_quit_event**: define what a quit event is
        (default: pygame.QUIT and Alt+f4)
      - **handle_event**: process a given event
@@ -24,6 +27,12 @@ class BaseController(object):
      - **self.state**: the state that uses the controller
      - **self.control**: the game that uses the controller
      - **self.model**: the model associated with the controller
+
+    The registered actions are resolved to their handlers (see
+    **BaseModel.resolve**). The handlers are cached until the model tree
+    changes, unless the model forwards its actions to another model: the
+    target of the forwarding (e.g. a room or a menu) may change without
+    any change of the tree.
     """
 
     def __init__(self, state, model):
@@ -36,6 +45,12 @@ class BaseController(object):
         self.state = state
         self.control = self.state.control
         self.model = model
+        self.handlers = {}
+        self.resolving = hasattr(model, "resolve")
+        self.cache_handlers = False
+        if self.resolving:
+            self.cache_handlers = not overrides(type(model), "resolve")
+            self.model.add_listener(self.clear_handlers)
         self.init()
 
     def init(self):
@@ -45,6 +60,23 @@ class BaseController(object):
         """
         pass
 
+    def reset(self):
+        """Empty method to override if needed.
+
+        Called after the model is reset in place.
+        """
+        pass
+
+    def delete(self):
+        """Stop listening to the model."""
+        if self.resolving:
+            self.model.remove_listener(self.clear_handlers)
+        self.handlers.clear()
+
+    def clear_handlers(self, event=None, model=None):
+        """Clear the resolved handlers when the model tree changes."""
+        self.handlers.clear()
+
     def _update(self):
         """Process the events.
 
@@ -103,8 +135,28 @@ class BaseController(object):
         Return:
             bool: True to indicate that the model wants to stop
             the current state, False otherwise.
+
+        The action is also written to the replay file of the state,
+        if it is being recorded.
         """
-        return bool(self.model.register(name, *args, **kwargs))
+        recorder = self.state.recorder
+        if recorder:
+            recorder.record(self.state.tick_count, name, args, kwargs)
+        # Models without handler resolution
+        if not self.resolving:
+            return bool(self.model.register(name, *args, **kwargs))
+        # Resolve the handler
+        if not self.cache_handlers:
+            resolved = self.model.resolve(name)
+        elif name in self.handlers:
+            resolved = self.handlers[name]
+        else:
+            resolved = self.handlers[name] = self.model.resolve(name)
+        if resolved is None:
+            return False
+        model, handler = resolved
+        model.wake()
+        return bool(handler(*args, **kwargs))
 
     def is_quit_event(self, event):
         """Define what a quit event is. Include pygame.Quit and Alt+F4.
@@ -237,6 +289,16 @@ class MappingController(BaseController):
         self.nb_players = max(pid for _, pid in self.key_dct.values())
         self.nb_players = max(self.nb_players, len(self.joysticks))
         self.players = range(1, self.nb_players + 1)
+        # Special actions
+        self.register_special_actions()
+
+    def reset(self):
+        """Register the special actions to the new model."""
+        self.register_special_actions()
+
+    def register_special_actions(self):
+        """Register the current directions and keys for the actions
+        that require an update on the first frame."""
         # Init direction
         for player in self.players:
             lst = [self.get_key_direction(player),
@@ -1,7 +1,58 @@
 """Module containing the model base class."""
 
 # Imports
-from itertools import count, chain
+from bisect import bisect_right
+from functools import partial
+from itertools import chain
+from mvctools.common import xyvector
+
+
+# Key generator
+class KeyGenerator(object):
+    """Counter providing the keys of a model tree.
+
+    Unlike **itertools.count**, its value can be saved and restored.
+    """
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self.value
+        self.value += 1
+        return value
+
+    next = __next__
+
+
+# Model metaclass
+class ModelMetaClass(type):
+    """Metaclass building the action table of the model classes.
+
+    The table maps the action names to the names of the corresponding
+    **register_<action>** methods, including the inherited ones, and
+    whether the class defines them. A class
+    overriding **register** without overriding **resolve** handles the
+    actions itself: its **resolve** method returns its **register**
+    method for all the actions.
+    """
+
+    def __new__(metacls, name, bases, attrs):
+        cls = type.__new__(metacls, name, bases, attrs)
+        prefix = "register_"
+        cls._actions = {attr[len(prefix):]: (attr, True)
+                        for attr in dir(cls) if attr.startswith(prefix)}
+        if "register" in attrs and "resolve" not in attrs:
+            cls.resolve = resolve_register
+        return cls
+
+
+def resolve_register(self, action):
+    """Resolve an action to the register method of the model."""
+    return self, partial(self.register, action)
 
 
 # Base model class
@@ -25,9 +76,18 @@ class BaseModel(object):
        (default: create a timer **self.lifetime**)
      - **reload**: called when the state is reloaded
        (default: do nothing)
+     - **reinit**: called when the state is reset in place
+       (default: unregister the children and call **init** again)
      - **update**: called at each tick of the state
        (default: do nothing)
 
+    The state of a model tree can be saved with **snapshot** and restored
+    with **restore**. The attributes to save are listed in the
+    **snapshot_fields** class attribute. A subclass may override
+    **dump_fields** and **load_fields** to save other values. The
+    attributes referencing the models created by **init** have to be
+    saved too, since **reinit** replaces these models.
+
     An instance has the following attributes:
      - **self.state**: the state that uses the controller
      - **self.control**: the game that uses the controller
@@ -36,9 +96,32 @@ class BaseModel(object):
      - **self.parent**: the parent of the model
      - **self.children**: the children dictionary
      - **self.isroot**: True if it is the main model
+     - **self.delta**: time difference with the last update
+     - **self.awake**: False if the model sleeps
+
+    The delta of a model is its **time_speed** multiplied by the delta
+    of its parent. It is computed once per tick from the delta of the
+    state, and propagated to the subtree when a time speed changes.
+
+    A model doing nothing until an event may **sleep**: its **update**
+    and **post_update** methods are skipped until it is woken up with
+    **wake**. Its children are not affected. A model is woken up when
+    it handles a registered action and when one of its timers starts.
     """
 
-    time_speed = 1.0
+    # Time
+    _time_speed = 1.0
+    _state_delta = 0.0
+    delta = 0.0
+
+    # Sleep
+    _awake = True
+
+    # Action table
+    __metaclass__ = ModelMetaClass
+
+    #: Attributes saved by the snapshots
+    snapshot_fields = ("time_speed", "awake")
 
     def __init__(self, parent, *args, **kargs):
         """Initialize the model with its parent and register itself.
@@ -54,15 +137,18 @@ class BaseModel(object):
         self.control = parent.control
         self.gamedata = self.control.gamedata
         # Semi private attribute
-        self._keygen = count() if self.isroot else parent._keygen
+        self._keygen = KeyGenerator() if self.isroot else parent._keygen
         # Useful attributes
         self.key = next(self._keygen)
         # Children and parent handling
         self.parent = parent
         self.children = {}
+        self._listeners = []
         if not self.isroot:
+            self.delta = self._time_speed * parent.delta
             self.parent._register_child(self)
         # Call user initialisation
+        self._init_args = args, kargs
         self.init(*args, **kargs)
 
     def init(self, *args, **kwargs):
@@ -77,21 +163,184 @@ class BaseModel(object):
         """
         self.lifetime = Timer(self).start()
 
+    def reinit(self):
+        """Restore the initial configuration of the model.
+
+        The children are unregistered, then **init** is called again with
+        the initialization arguments. The model keeps its key, so the
+        views only replace the sprites of its subtree.
+        """
+        for child in list(self.children.values()):
+            self._unregister_child(child)
+        self.wake()
+        args, kwargs = self._init_args
+        self.init(*args, **kwargs)
+
     def _register_child(self, child):
-        """Register a new child.
+        """Register a new child and publish an **add** event.
 
         Args:
             child (BaseModel): the child to register
         """
         self.children[child.key] = child
+        self._publish("add", child)
 
     def _unregister_child(self, child):
-        """Unregister a child if registered.
+        """Unregister a child if registered and publish a **remove** event.
 
         Args:
             child (BaseModel): the child to unregister
         """
-        self.children.pop(child.key, None)
+        if self.children.pop(child.key, None) is child:
+            self._publish("remove", child)
+
+    def _publish(self, event, model):
+        """Publish a change of the tree to the listeners of the model
+        and its ancestors.
+
+        Args:
+            event (str): "add" or "remove"
+            model (BaseModel): the added or removed model
+        """
+        node = self
+        while True:
+            for listener in node._listeners:
+                listener(event, model)
+            if node.isroot:
+                return
+            node = node.parent
+
+    def add_listener(self, listener):
+        """Listen to the changes of the subtree.
+
+        Args:
+            listener (callable): called with the event name ("add" or
+                                 "remove") and the corresponding model
+
+        The events are published when a model is registered (at
+        initialization or when its parent changes) and unregistered
+        (at deletion or when its parent changes). The children of an
+        added or removed model do not publish events.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop listening to the changes of the subtree, if listening.
+
+        Args:
+            listener (callable): the listener to remove
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def snapshot(self, buffer=None):
+        """Save the state of the model and its children into a flat list.
+
+        Args:
+            buffer (list): list to reuse, cleared first (optional)
+        Return:
+            list: the snapshot, to pass to **restore**
+
+        The snapshot starts with the model and the next key of the tree.
+        Then, for each model of the subtree, it contains the model itself,
+        its key, its number of children and the values of its snapshot
+        fields. The values are not copied, so they have to be immutable,
+        except for the xyvectors that are saved as tuples.
+        """
+        if buffer is None:
+            buffer = []
+        else:
+            del buffer[:]
+        buffer.append(self)
+        buffer.append(self._keygen.value)
+        self._dump(buffer)
+        return buffer
+
+    def restore(self, snapshot):
+        """Restore the state of the model and its children.
+
+        Args:
+            snapshot (list): a snapshot taken on this model
+
+        The models created since the snapshot are unregistered and the
+        models removed since the snapshot are registered again, so the
+        views receive the corresponding events. The key generator is
+        restored too, so the models created after a restore get the
+        same keys (and the same update order) as after the snapshot.
+        """
+        if not snapshot or snapshot[0] is not self:
+            raise ValueError("The snapshot was not taken on this model")
+        self._keygen.value = snapshot[1]
+        self._load(snapshot, 2)
+
+    def dump_fields(self, buffer):
+        """Append the values of the snapshot fields to a buffer.
+
+        Missing attributes are saved as None.
+        """
+        for name in self.snapshot_fields:
+            value = getattr(self, name, None)
+            if type(value) is xyvector:
+                value = value.x, value.y
+            buffer.append(value)
+
+    def load_fields(self, buffer, index):
+        """Restore the snapshot fields from a buffer.
+
+        Args:
+            buffer (list): the snapshot
+            index (int): position of the first value
+        Return:
+            int: position of the next value
+        """
+        for name in self.snapshot_fields:
+            value = buffer[index]
+            index += 1
+            current = getattr(self, name, None)
+            if type(current) is xyvector:
+                current.set_ip(value)
+            else:
+                setattr(self, name, value)
+        return index
+
+    def _dump(self, buffer):
+        """Recursively append the state of the subtree to a buffer."""
+        buffer.append(self)
+        buffer.append(self.key)
+        buffer.append(len(self.children))
+        self.dump_fields(buffer)
+        for child in self.children.values():
+            child._dump(buffer)
+
+    def _load(self, buffer, index):
+        """Recursively restore the subtree from a buffer.
+
+        Return:
+            int: position of the next model in the buffer
+        """
+        number = buffer[index + 2]
+        index = self.load_fields(buffer, index + 3)
+        if not number and not self.children:
+            return index
+        children = {}
+        for _ in range(number):
+            child, key = buffer[index], buffer[index + 1]
+            # Moved or deleted child
+            if child.parent is not self or child.key != key:
+                parent = child.parent
+                if parent and parent.children.get(child.key) is child:
+                    parent._unregister_child(child)
+                child.parent, child.key = self, key
+            children[key] = child
+            index = child._load(buffer, index)
+        # Publish the changes
+        for key, child in list(self.children.items()):
+            if children.get(key) is not child:
+                self._unregister_child(child)
+        for key, child in children.items():
+            if key not in self.children:
+                self._register_child(child)
+        return index
 
     def _update_children(self):
         """Update all the children.
@@ -107,28 +356,48 @@ class BaseModel(object):
         Return:
             bool: True to stop the current state, False otherwise.
         """
+        if not self._awake:
+            return self._update_children()
         return self.update() or self._update_children() or self.post_update()
 
+    def is_idle(self):
+        """Return True if the model and its children are not changing
+        by themselves, i.e. until an action is registered.
+
+        The base implementation checks the children. It should be
+        extended by the models changing in their update methods.
+        """
+        return all(child.is_idle() for child in self.children.values())
+
     def change_parent(self, parent):
         """Change the parent of the model.
 
+        The model is unregistered from its previous parent and gets
+        a new key from its new parent.
+
         Args:
             parent (BaseModel or BaseControl): the parent of the model
         """
+        if not self.isroot:
+            self.parent._unregister_child(self)
         self.isroot = not isinstance(parent, BaseModel)
         # Attributes to higher instances
         self.state = parent if self.isroot else parent.state
         self.control = parent.control
         self.gamedata = self.control.gamedata
         # Semi private attribute
-        self._keygen = count() if self.isroot else parent._keygen
+        self._keygen = KeyGenerator() if self.isroot else parent._keygen
         # Useful attributes
         self.key = next(self._keygen)
         # Children and parent handling
         self.parent = parent
+        for key, model in self.gen_model_dct():
+            model.state = self.state
+            model.control = self.control
+            model.gamedata = self.gamedata
+        self.time_speed = self._time_speed
         if not self.isroot:
             self.parent._register_child(self)
-        
 
     def update(self):
         """Empty method to override.
@@ -191,17 +460,113 @@ class BaseModel(object):
         This choice has been made on purpose, considering the controller
         might register more types of actions than the model can handle.
         """
-        method_name = "_".join(("register", action.lower()))
+        handler = self._get_handler(action)
         # Ignore if no corresponding method
-        if not hasattr(self, method_name):
+        if handler is None:
             return False
         # Call the corresponding method
-        return getattr(self, method_name)(*args, **kwargs)
+        self.wake()
+        return handler(*args, **kwargs)
+
+    def resolve(self, action):
+        """Return the model handling an action and its handler.
+
+        Args:
+            action (str): name of the action
+        Return:
+            tuple: the model and the bound handler, or None if the action
+            is not handled
+
+        The controllers call the handler directly, and cache it unless
+        the model overrides this method. A model forwarding its actions
+        to another model should override this method along with
+        **register**.
+        """
+        handler = self._get_handler(action)
+        if handler is None:
+            return None
+        return self, handler
+
+    def _get_handler(self, action):
+        """Return the handler of an action, or None.
+
+        The action names missing from the table of the class (e.g. in
+        upper case) are added to it. The handlers set on the instance
+        are found too.
+        """
+        actions = self._actions
+        try:
+            method_name, in_class = actions[action]
+        except KeyError:
+            method_name = "_".join(("register", action.lower()))
+            in_class = hasattr(type(self), method_name)
+            actions[action] = method_name, in_class
+        if in_class:
+            return getattr(self, method_name)
+        return self.__dict__.get(method_name)
 
     @property
-    def delta(self):
-        """Time difference with last update."""
-        return self.time_speed * self.parent.delta
+    def time_speed(self):
+        """Speed of the time of the model, relative to its parent."""
+        return self._time_speed
+
+    @time_speed.setter
+    def time_speed(self, value):
+        self._time_speed = value
+        if self.isroot:
+            self._set_delta(value * self._state_delta)
+        elif self.parent is not None:
+            self._set_delta(value * self.parent.delta)
+
+    def _set_delta(self, delta):
+        """Set the delta of the model and propagate it to the subtree.
+
+        The subtrees whose delta does not change are skipped.
+        """
+        if delta == self.delta:
+            return
+        self.delta = delta
+        for child in self.children.values():
+            child._set_delta(child._time_speed * delta)
+
+    def _update_delta(self, state_delta):
+        """Set the delta of the state, called on the main model
+        before each update.
+        """
+        if state_delta != self._state_delta:
+            self._state_delta = state_delta
+            self._set_delta(self._time_speed * state_delta)
+
+    @property
+    def awake(self):
+        """False if the updates of the model are skipped."""
+        return self._awake
+
+    @awake.setter
+    def awake(self, value):
+        value = bool(value)
+        if value == self._awake:
+            return
+        self._awake = value
+        schedule = getattr(self.state, "update_schedule", None)
+        if schedule is not None:
+            schedule.notify("wake" if value else "sleep", self)
+
+    def sleep(self):
+        """Skip the updates of the model until it is woken up.
+
+        The model sleeps from the next tick on if it is called
+        during an update.
+        """
+        self.awake = False
+
+    def wake(self):
+        """Resume the updates of the model.
+
+        If it is called during an update, the model is updated in the
+        current tick if its turn did not come yet.
+        """
+        self.awake = True
 
     def __iter__(self):
         """Iterator support.
@@ -236,8 +601,15 @@ class Timer(BaseModel):
 
     It uses the current system FPS value to update accordingly.
     This way, the timer ignore lags or frame rate variations.
+
+    A paused timer sleeps once its last increment is applied, so it is
+    left out of the update schedule until it starts again.
     """
 
+    snapshot_fields = BaseModel.snapshot_fields + \
+        ("_current_value", "_ratio", "_next_increment")
+
+
     def init(self, start=0, stop=None, periodic=False, callback=None):
         """Initalize the timer.
 
@@ -260,7 +632,7 @@ class Timer(BaseModel):
         self._ratio = 0.0
         self._current_value = float(start)
         self._next_increment = 0.0
-        
+
     @property
     def interval(self):
         """Return the (start, stop) interval as a tuple."""
@@ -285,6 +657,54 @@ class Timer(BaseModel):
         """Return True if the timer is paused, False otherwise."""
         return self._ratio == 0
 
+    def _update(self):
+        """Update the timer if it is running or has a pending increment.
+
+        Sleep otherwise.
+        """
+        if self._ratio or self._next_increment:
+            self.update()
+        else:
+            self.sleep()
+
+    def is_idle(self):
+        """Return True if the timer does not change the model by itself.
+
+        A running timer is idle if it has no callback and never stops,
+        i.e. it is periodic or runs toward an infinite bound. Its value
+        may still drive an animation (e.g. **self.lifetime**), in which
+        case the view registers the next redraw (see **get_delay**).
+        """
+        if self.is_paused:
+            return not self._next_increment
+        if callable(self._callback):
+            return False
+        bound = self._stop if self._ratio > 0 else self._start
+        return self._periodic or abs(bound) == float("inf")
+
+    def get_delay(self, value):
+        """Return the time before the timer reaches a given value.
+
+        The increment prepared by the last update is taken into account.
+
+        Args:
+            value (float): value to reach
+        Return:
+            float or None: delay in seconds, shortened if the timer
+                           reaches its bound first. None if the timer
+                           is paused, at the value or running away
+                           from it.
+        """
+        if self.is_paused:
+            return None
+        ratio, current = self._ratio, self._current_value
+        delay = (value - current) / ratio
+        if delay <= 0:
+            return None
+        bound = self._stop if ratio > 0 else self._start
+        delay = min(delay, (bound - current) / ratio)
+        return max(delay - self._next_increment / ratio, 0.0)
+
     def start(self, ratio=1.0):
         """Start the timer.
 
@@ -294,6 +714,9 @@ class Timer(BaseModel):
             itself for affectation
         """
         self._ratio = float(ratio)
+        self.wake()
+        if isinstance(self.parent, BaseModel):
+            self.parent.wake()
         return self
 
     def pause(self):
@@ -356,8 +779,8 @@ class Timer(BaseModel):
     def update(self):
         """Update the timer.
 
-        Use **self.state.current_fps** to update the current value
-        accordingly. Also call the callback if needed."""
+        Apply the increment prepared by the previous update, call the
+        callback if needed and prepare the next increment."""
         # Increment
         self._current_value += self._next_increment
         # Overflow
@@ -373,3 +796,136 @@ class Timer(BaseModel):
                 self._callback(self)
         # Prepare next increment
         self._next_increment = self.delta*self._ratio
+
+
+# Update schedule
+class UpdateSchedule(object):
+    """Flattened update order of a model tree.
+
+    Args:
+        model (BaseModel): the root of the tree
+
+    The schedule lists the **update** and **post_update** methods of
+    the models, in the order of **BaseModel._update**: the update of a
+    model, the updates of its children, then its post update. The
+    methods that are not overridden are left out, and so are the sleeping
+    models. A model overriding **_update** or **_update_children** (e.g.
+    a timer) is kept as a single entry, left out while it sleeps if it
+    has no children.
+
+    The schedule listens to the tree and is rebuilt on the next run
+    after a change, or after a model sleeps or wakes up. The models
+    removed during a run are skipped for the rest of it, and the added
+    ones are updated from the next run on. When a model wakes up during
+    a run, the schedule is rebuilt right away and the run goes on from
+    the same position in the tree, so a timer started during an update
+    is still updated in this tick if it comes later in the tree.
+    """
+
+    def __init__(self, model):
+        """Listen to the tree."""
+        self.model = model
+        self.entries = None
+        self.orders = None
+        self.running = False
+        self.changed = False
+        self.woken = False
+        self.removed = set()
+        model.add_listener(self.notify)
+
+    def invalidate(self):
+        """Rebuild the schedule on the next run."""
+        self.entries = None
+
+    def notify(self, event, model):
+        """Invalidate the schedule.
+
+        The events are the tree changes ("add" and "remove"), and the
+        "sleep" and "wake" events sent by the models themselves.
+        """
+        self.invalidate()
+        if not self.running:
+            return
+        if event == "wake":
+            self.woken = True
+        elif event != "sleep":
+            self.changed = True
+        if event == "remove":
+            self.removed.update(child for key, child
+                                in model.gen_model_dct())
+
+    def build(self):
+        """Flatten the tree."""
+        self.entries = []
+        self.orders = []
+        self.flatten(self.model, [0])
+
+    def flatten(self, model, counter):
+        """Append the entries of a subtree.
+
+        Each possible entry gets an order, whether the model sleeps
+        or not, so the orders do not change when a model wakes up.
+        """
+        cls = type(model)
+        if overrides(cls, "_update") or overrides(cls, "_update_children"):
+            if model._awake:
+                self.append(model, model._update, counter)
+            elif model.children:
+                self.append(model, model._update_children, counter)
+            counter[0] += 1
+            return
+        awake = model._awake
+        if awake and overrides(cls, "update"):
+            self.append(model, model.update, counter)
+        counter[0] += 1
+        for child in model.children.values():
+            self.flatten(child, counter)
+        if awake and overrides(cls, "post_update"):
+            self.append(model, model.post_update, counter)
+        counter[0] += 1
+
+    def append(self, model, method, counter):
+        """Append an entry with the current order."""
+        self.entries.append((model, method))
+        self.orders.append(counter[0])
+
+    def run(self):
+        """Run the updates until one of them returns True.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        if self.entries is None:
+            self.build()
+        self.running = True
+        try:
+            entries, index = self.entries, 0
+            while index < len(entries):
+                model, method = entries[index]
+                index += 1
+                if self.removed and model in self.removed:
+                    continue
+                if method():
+                    return True
+                # A model woke up
+                if self.woken and not self.changed:
+                    self.woken = False
+                    order = self.orders[index-1]
+                    self.build()
+                    entries = self.entries
+                    index = bisect_right(self.orders, order)
+            return False
+        finally:
+            self.running = False
+            self.changed = self.woken = False
+            self.removed.clear()
+
+    def __len__(self):
+        if self.entries is None:
+            self.build()
+        return len(self.entries)
+
+
+def overrides(cls, name):
+    """Return True if a model class overrides a method of BaseModel."""
+    return getattr(cls, name) != getattr(BaseModel, name)
@@ -0,0 +1,584 @@
+"""Module to synchronize a state between two peers over UDP.
+
+The actions registered by the controllers are the inputs of the game:
+they are tagged with the tick they apply to and sent to the remote peer.
+Two synchronization modes are available:
+ - **rollback**: the local actions are applied immediately, while the
+   remote actions are predicted: a tick simulated before the remote
+   actions are received assumes that the remote peer did nothing. If
+   actions are received later for such a tick, the model is restored to
+   the snapshot of that tick and the following ticks are simulated again.
+ - **lockstep**: the local actions are delayed by a few ticks, and a
+   tick is simulated only once the actions of both peers are known.
+
+A packet is encoded with the replay format functions (see
+mvctools.replay) and contains the following fields:
+ - **header**: magic string, format version, first tick, number of ticks
+   and acknowledged tick (next remote tick expected)
+ - **ticks**: for each tick, the number of actions followed by the
+   actions (name, number of arguments, number of keyword arguments
+   and arguments)
+
+Each packet contains the actions of all the ticks not acknowledged yet,
+so the lost packets never need to be resent.
+"""
+
+# Imports
+import math
+import struct
+import socket
+import random
+from heapq import heappush, heappop
+from itertools import count
+from timeit import default_timer
+from mvctools.state import BaseState
+from mvctools.timing import RingBuffer
+from mvctools.replay import encode_string, decode_string
+from mvctools.replay import encode_arguments, decode_arguments
+
+
+# Format
+MAGIC = b"MVCN"
+VERSION = 1
+HEADER = struct.Struct("<4sBIHI")
+NUMBER = struct.Struct("<B")
+ARGUMENTS = struct.Struct("<BB")
+
+
+# Encoding functions
+def encode_packet(first, inputs, ack):
+    """Encode the actions of consecutive ticks.
+
+    Args:
+        first (int): tick of the first actions
+        inputs (list): (name, args, kwargs) tuples for each tick
+        ack (int): next tick expected from the remote peer
+    """
+    data = [HEADER.pack(MAGIC, VERSION, first, len(inputs), ack)]
+    for actions in inputs:
+        data.append(NUMBER.pack(len(actions)))
+        for name, args, kwargs in actions:
+            data.append(encode_string(name))
+            data.append(ARGUMENTS.pack(len(args), len(kwargs)))
+            data.append(encode_arguments(args, kwargs))
+    return b"".join(data)
+
+
+def decode_packet(data):
+    """Decode a packet.
+
+    Return:
+        tuple: (first tick, list of actions for each tick, ack)
+    Raise:
+        ValueError: if the packet is not valid
+    """
+    try:
+        magic, version, first, length, ack = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Invalid packet")
+        offset, inputs = HEADER.size, []
+        for _ in range(length):
+            number, = NUMBER.unpack_from(data, offset)
+            offset += NUMBER.size
+            actions = []
+            for _ in range(number):
+                name, offset = decode_string(data, offset)
+                nargs, nkwargs = ARGUMENTS.unpack_from(data, offset)
+                offset += ARGUMENTS.size
+                args, kwargs, offset = decode_arguments(data, offset,
+                                                        nargs, nkwargs)
+                actions.append((name, args, kwargs))
+            inputs.append(tuple(actions))
+    except (struct.error, KeyError, UnicodeDecodeError):
+        raise ValueError("Corrupted packet")
+    return first, inputs, ack
+
+
+# UDP transport
+class UDPTransport(object):
+    """Non-blocking UDP socket with a latency and loss injector.
+
+    Args:
+        address (tuple): local (host, port) to bind
+        peer (tuple): remote (host, port), or None to use the source
+                      of the first packet received
+        latency (float): delay added to the sent packets, in seconds
+        jitter (float): maximum random delay added to the latency
+        loss (float): ratio of sent packets to drop
+        seed (int): seed of the injector (optional)
+        clock (callable): time function (default is timeit.default_timer)
+
+    The injector applies to the sent packets only, so the round trip time
+    between two injected peers is twice the latency.
+    """
+
+    buffer_size = 4096
+
+    def __init__(self, address, peer=None, latency=0.0, jitter=0.0,
+                 loss=0.0, seed=None, clock=default_timer):
+        """Bind the socket."""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+        self.peer = peer
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.delayed = []
+        self.order = count()
+        self.sent = 0
+        self.dropped = 0
+        self.received = 0
+
+    def send(self, data):
+        """Send a packet to the peer, if known."""
+        if self.peer is None:
+            return
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.jitter * self.random.random()
+        if not delay:
+            return self.send_now(data)
+        heappush(self.delayed, (self.clock() + delay, next(self.order), data))
+
+    def send_now(self, data):
+        """Send a packet without delay."""
+        try:
+            self.socket.sendto(data, self.peer)
+            self.sent += 1
+        except socket.error:
+            self.dropped += 1
+
+    def flush(self):
+        """Send the delayed packets that are due."""
+        now = self.clock()
+        while self.delayed and self.delayed[0][0] <= now:
+            self.send_now(heappop(self.delayed)[2])
+
+    def receive(self):
+        """Return the list of packets received from the peer."""
+        self.flush()
+        packets = []
+        while True:
+            try:
+                data, address = self.socket.recvfrom(self.buffer_size)
+            except socket.error:
+                return packets
+            if self.peer is None:
+                self.peer = address
+            if address == self.peer:
+                self.received += 1
+                packets.append(data)
+
+    def close(self):
+        """Close the socket."""
+        self.socket.close()
+
+
+# Network session
+class NetworkSession(object):
+    """Exchange the actions of a state with a remote peer.
+
+    Args:
+        state (NetworkState): the synchronized state
+        transport (UDPTransport): connection to the remote peer
+        local_player (int): player of the local peer
+        remote_player (int): player of the remote peer
+
+    The actions of both players are applied in the order of the player
+    numbers, so the peers simulate exactly the same ticks. The round
+    trip time is measured from the acknowledgements of the local ticks.
+
+    Subclasses implement **advance**, called once per model update.
+    """
+
+    #: Disconnection timeout, in seconds
+    timeout = 5.0
+
+    def __init__(self, state, transport, local_player, remote_player):
+        """Initialize the buffers."""
+        self.state = state
+        self.transport = transport
+        self.local_player = local_player
+        self.remote_player = remote_player
+        self.local_first = local_player < remote_player
+        self.pending = []
+        self.local_inputs = {}
+        self.remote_inputs = {}
+        self.send_times = {}
+        self.sent_end = 0
+        self.remote_ack = 0
+        self.confirmed = 0
+        self.last_receive = None
+        # Statistics
+        self.stalls = 0
+        self.rtt = RingBuffer(60)
+
+    def register(self, name, *args, **kwargs):
+        """Queue a local action.
+
+        The session replaces the model of the controller, so the
+        registered actions go through it.
+        """
+        self.pending.append((name, args, kwargs))
+        return False
+
+    def advance(self):
+        """Empty method to override.
+
+        Called at each tick of the state to simulate the next tick
+        if possible.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        return False
+
+    def receive(self):
+        """Store the remote actions.
+
+        Return:
+            list: the ticks received for the first time
+        """
+        received = []
+        for data in self.transport.receive():
+            try:
+                first, inputs, ack = decode_packet(data)
+            except ValueError:
+                continue
+            self.last_receive = default_timer()
+            if ack > self.remote_ack:
+                self.acknowledge(ack)
+            for tick, actions in enumerate(inputs, first):
+                if tick < self.confirmed or tick in self.remote_inputs:
+                    continue
+                self.remote_inputs[tick] = actions
+                received.append(tick)
+            while self.confirmed in self.remote_inputs:
+                self.confirmed += 1
+        return received
+
+    def acknowledge(self, ack):
+        """Measure the round trip time of the last acknowledged tick."""
+        sent = self.send_times.get(ack - 1)
+        if sent is not None:
+            self.rtt.append(self.transport.clock() - sent)
+        for tick in range(self.remote_ack, ack):
+            self.send_times.pop(tick, None)
+        self.remote_ack = ack
+
+    def send(self, end):
+        """Send the local actions not acknowledged by the remote peer.
+
+        Args:
+            end (int): tick following the last local actions
+        """
+        # Forget the actions that are no longer needed
+        oldest = min(self.confirmed, self.remote_ack, self.state.tick_count)
+        for inputs in (self.local_inputs, self.remote_inputs):
+            for tick in [key for key in inputs if key < oldest]:
+                del inputs[tick]
+        # Send times
+        now = self.transport.clock()
+        for tick in range(self.sent_end, end):
+            self.send_times[tick] = now
+        self.sent_end = max(self.sent_end, end)
+        # Send
+        first = min(self.remote_ack, end)
+        inputs = [self.local_inputs[key] for key in range(first, end)]
+        self.transport.send(encode_packet(first, inputs, self.confirmed))
+
+    def apply(self, tick):
+        """Apply the actions of both players and update the model.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        model = self.state.model
+        local = self.local_inputs.get(tick, ())
+        remote = self.remote_inputs.get(tick, ())
+        actions = local + remote if self.local_first else remote + local
+        for name, args, kwargs in actions:
+            if model.register(name, *args, **kwargs):
+                return True
+        return self.state.simulate_tick()
+
+    @property
+    def disconnected(self):
+        """True if the remote peer stopped sending packets."""
+        if self.last_receive is None:
+            return False
+        return default_timer() - self.last_receive > self.timeout
+
+    def report(self):
+        """Return a dictionary of statistics."""
+        return {"ticks": self.state.tick_count,
+                "stalls": self.stalls,
+                "rtt": self.rtt.percentiles(0.5, 0.95, 0.99),
+                "sent": self.transport.sent,
+                "dropped": self.transport.dropped,
+                "received": self.transport.received}
+
+
+# Rollback session
+class RollbackSession(NetworkSession):
+    """Rollback synchronization of a state with a remote peer.
+
+    The local actions are applied on the next tick, and the remote ones
+    are predicted (no action). A snapshot of the model is saved before
+    each tick, for the last **max_rollback** ticks. The local peer stalls
+    when it gets **max_rollback** ticks ahead of the last remote actions
+    received.
+
+    The following statistics are available:
+     - **rollbacks**: number of rollbacks
+     - **resimulated**: number of ticks simulated again
+     - **stalls**: number of ticks delayed to wait for the remote peer
+     - **resim_times**: duration of the rollbacks, in seconds
+    """
+
+    #: Maximum number of ticks to simulate again
+    max_rollback = 8
+
+    def __init__(self, state, transport, local_player, remote_player):
+        """Initialize the snapshots."""
+        NetworkSession.__init__(self, state, transport,
+                                local_player, remote_player)
+        self.snapshots = [[] for _ in range(self.max_rollback + 1)]
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.resim_times = RingBuffer(600)
+
+    def advance(self):
+        """Simulate the next tick, after a rollback if needed.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        # Remote actions
+        tick = self.state.tick_count
+        received = self.receive()
+        if self.disconnected:
+            return True
+        # Predicted without any action
+        mispredicted = [key for key in received
+                        if key < tick and self.remote_inputs[key]]
+        if mispredicted and self.rollback(min(mispredicted)):
+            return True
+        # Wait for the remote peer
+        if tick - self.confirmed >= self.max_rollback:
+            self.stalls += 1
+            self.state.frame_timer.count("stall")
+            self.send(tick)
+            return False
+        # Local actions
+        self.local_inputs[tick] = tuple(self.pending)
+        del self.pending[:]
+        stop = self.simulate(tick)
+        self.send(tick + 1)
+        return stop
+
+    def rollback(self, tick):
+        """Restore the snapshot of a tick and simulate the following ticks.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        state = self.state
+        current = state.tick_count
+        start = default_timer()
+        state.model.restore(self.snapshots[tick % len(self.snapshots)])
+        state.tick_count = tick
+        try:
+            while state.tick_count < current:
+                if self.simulate(state.tick_count):
+                    return True
+        finally:
+            self.resim_times.append(default_timer() - start)
+            self.rollbacks += 1
+            self.resimulated += current - tick
+            state.frame_timer.count("rollback")
+        return False
+
+    def simulate(self, tick):
+        """Save a snapshot, then apply the actions of a tick."""
+        self.state.model.snapshot(self.snapshots[tick % len(self.snapshots)])
+        return self.apply(tick)
+
+    def report(self):
+        """Return a dictionary of statistics."""
+        report = NetworkSession.report(self)
+        times = self.resim_times
+        report.update(rollbacks=self.rollbacks,
+                      resimulated=self.resimulated,
+                      resim_times=times.percentiles(0.5, 0.95, 0.99),
+                      resim_max=max(times.get_values() or [0.0]))
+        return report
+
+
+# Lockstep session
+class LockstepSession(NetworkSession):
+    """Lockstep synchronization of a state with a remote peer.
+
+    The local actions are delayed by **input_delay** ticks, and a tick
+    is simulated only once the remote actions for this tick are known.
+    All the ticks of the delay are sent in the same packet, and resent
+    until acknowledged.
+
+    If **adaptive** is set, the input delay follows the measured round
+    trip time: it covers the one-way latency (half of the p95 round trip
+    time) plus **delay_margin** ticks, within **min_delay** and
+    **max_delay**. The delay is local to each peer and can change at any
+    time, since the actions are tagged with their tick.
+
+    The following statistics are available:
+     - **stalls**: number of ticks delayed to wait for the remote peer
+     - **wait_times**: duration of the waits, in seconds
+     - **input_delay**: current input delay, in ticks
+    """
+
+    #: Delay of the local actions, in ticks
+    input_delay = 2
+    #: Adapt the delay to the round trip time
+    adaptive = True
+    delay_margin = 1
+    min_delay = 1
+    max_delay = 15
+
+    def __init__(self, state, transport, local_player, remote_player):
+        """Initialize the statistics."""
+        NetworkSession.__init__(self, state, transport,
+                                local_player, remote_player)
+        self.scheduled = 0
+        self.wait_start = None
+        self.wait_times = RingBuffer(600)
+
+    def advance(self):
+        """Simulate the next tick, if the remote actions are known.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        tick = self.state.tick_count
+        self.receive()
+        if self.disconnected:
+            return True
+        if self.adaptive:
+            self.adapt()
+        # Schedule the local actions
+        end = tick + self.input_delay + 1
+        if end > self.scheduled:
+            for key in range(self.scheduled, end):
+                self.local_inputs[key] = ()
+            self.local_inputs[end - 1] = tuple(self.pending)
+            del self.pending[:]
+            self.scheduled = end
+        self.send(self.scheduled)
+        # Wait for the remote peer
+        now = self.transport.clock()
+        if tick >= self.confirmed:
+            self.stalls += 1
+            self.state.frame_timer.count("stall")
+            if self.wait_start is None:
+                self.wait_start = now
+            return False
+        if self.wait_start is not None:
+            self.wait_times.append(now - self.wait_start)
+            self.wait_start = None
+        return self.apply(tick)
+
+    def adapt(self):
+        """Update the input delay from the round trip time."""
+        if not len(self.rtt):
+            return
+        rtt, = self.rtt.percentiles(0.95)
+        delay = int(math.ceil(rtt * self.state.sim_rate / 2))
+        delay += self.delay_margin
+        self.input_delay = max(self.min_delay, min(self.max_delay, delay))
+
+    def report(self):
+        """Return a dictionary of statistics."""
+        report = NetworkSession.report(self)
+        times = self.wait_times
+        report.update(input_delay=self.input_delay,
+                      wait_times=times.percentiles(0.5, 0.95, 0.99),
+                      wait_total=sum(times.get_values()))
+        return report
+
+
+# Network state
+class NetworkState(BaseState):
+    """State synchronized with a remote peer through a network session.
+
+    The controller registers the actions to the session instead of the
+    model. The model is updated with a fixed time step (**sim_fps**, or
+    **fps** if not set), and the replay recording is disabled.
+
+    The connection is defined by the following class attributes, usually
+    set with **network_state**:
+     - **session_class**: RollbackSession or LockstepSession
+     - **transport**: the UDPTransport to the remote peer
+     - **local_player**: player of the local peer
+     - **remote_player**: player of the remote peer
+    """
+
+    session_class = RollbackSession
+    transport = None
+    local_player = 1
+    remote_player = 2
+
+    def __init__(self, control, headless=None):
+        """Create the session before the controller."""
+        self.session = self.session_class(self, self.transport,
+                                          self.local_player,
+                                          self.remote_player)
+        settings = control.settings
+        self.sim_rate = float(settings.sim_fps or settings.fps)
+        BaseState.__init__(self, control, headless)
+
+    def create_controller(self):
+        return self.controller_class(self, self.session)
+
+    def create_recorder(self):
+        return None
+
+    def update_model(self):
+        return self.session.advance()
+
+    def simulate_tick(self):
+        return BaseState.update_model(self)
+
+    def is_idle(self):
+        return False
+
+    @property
+    def delta(self):
+        return 1.0 / self.sim_rate
+
+
+# Network state factory
+def network_state(state_class, transport, local_player, remote_player,
+                  session_class=None, **options):
+    """Build a network state class for a given connection.
+
+    Args:
+        state_class (type): subclass of NetworkState
+        transport (UDPTransport): connection to the remote peer
+        local_player (int): player of the local peer
+        remote_player (int): player of the remote peer
+        session_class (type): session class (optional)
+        options: session class attributes to override (optional)
+    """
+    attrs = {"transport": transport,
+             "local_player": local_player,
+             "remote_player": remote_player}
+    session_class = session_class or state_class.session_class
+    if options:
+        session_class = type(session_class.__name__, (session_class,),
+                             options)
+    attrs["session_class"] = session_class
+    return type("Network" + state_class.__name__, (state_class,), attrs)
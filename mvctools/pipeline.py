@@ -0,0 +1,82 @@
+"""Module to run the rendering of the frames on a worker thread.
+
+The blits and scaling operations of pygame release the GIL, so the
+drawing of a frame can overlap with the simulation of the next one.
+"""
+
+# Imports
+import threading
+
+
+# Render thread
+class RenderThread(object):
+    """Worker thread running one job at a time.
+
+    A job is submitted once the previous one is finished. Its result
+    (or its exception) is returned by the **wait** method. The thread
+    is a daemon, so it never prevents the program from exiting.
+    """
+
+    def __init__(self):
+        """Start the thread."""
+        self.job = None
+        self.result = None
+        self.error = None
+        self.pending = False
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self.done.set()
+        self.thread = threading.Thread(target=self.run, name="render")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, func, *args):
+        """Run a function on the thread, after the previous job."""
+        self.wait()
+        self.job = func, args
+        self.pending = True
+        self.done.clear()
+        self.ready.set()
+
+    def wait(self):
+        """Wait for the current job and return its result.
+
+        None is returned if there is no job to wait for.
+        Raise the exception of the job, if any.
+        """
+        if not self.pending:
+            return None
+        self.done.wait()
+        self.pending = False
+        result, self.result = self.result, None
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return result
+
+    def run(self):
+        """Thread loop."""
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            if self.job is None:
+                return
+            func, args = self.job
+            try:
+                self.result = func(*args)
+            except Exception as error:
+                self.error = error
+            self.job = None
+            self.done.set()
+
+    def close(self):
+        """Wait for the current job and stop the thread.
+
+        Return the result of the last job.
+        """
+        try:
+            return self.wait()
+        finally:
+            self.job = None
+            self.ready.set()
+            self.thread.join()
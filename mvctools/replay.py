@@ -0,0 +1,363 @@
+"""Module to record and replay the actions registered by the controllers.
+
+A replay file starts with a header containing a magic string, a format
+version and the path of the recorded state class. It is followed by
+records starting with a one-character kind:
+ - **N**: action name definition (code, name)
+ - **D**: delta change (tick, delta)
+ - **A**: registered action (tick, code, arguments, keyword arguments)
+ - **E**: end of the recording (tick)
+
+Action names are only written once, then referred to by their code.
+The delta is only written when it changes, so a recording made in the
+headless mode contains a single delta record.
+"""
+
+# Imports
+import struct
+from numbers import Integral
+from itertools import count
+from importlib import import_module
+import pygame as pg
+from mvctools.common import xytuple
+from mvctools.controller import BaseController
+
+
+# Format
+MAGIC = b"MVCR"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+LENGTH = struct.Struct("<B")
+DELTA = struct.Struct("<Id")
+ACTION = struct.Struct("<IBBB")
+END = struct.Struct("<I")
+
+# Tagged values
+VALUE_STRUCTS = {b"?": struct.Struct("<?"),
+                 b"i": struct.Struct("<i"),
+                 b"q": struct.Struct("<q"),
+                 b"f": struct.Struct("<d")}
+INT_RANGE = -2**31, 2**31 - 1
+STRING_TYPES = str, type(u"")
+
+
+# Encoding functions
+def encode_string(string):
+    """Encode a short string with its length."""
+    raw = string.encode("utf-8")
+    return LENGTH.pack(len(raw)) + raw
+
+
+def decode_string(data, offset):
+    """Decode a short string and return (string, new offset)."""
+    length, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    return data[offset:offset+length].decode("utf-8"), offset + length
+
+
+def encode_value(value):
+    """Encode an action argument as a tagged binary string.
+
+    Supported values are None, booleans, integers (up to 64 bits),
+    floats, short strings (decoded as unicode) and 2-elements tuples
+    of those (decoded as xytuples).
+    """
+    if value is None:
+        return b"N"
+    if isinstance(value, bool):
+        return b"?" + VALUE_STRUCTS[b"?"].pack(value)
+    if isinstance(value, Integral):
+        tag = b"i" if INT_RANGE[0] <= value <= INT_RANGE[1] else b"q"
+        return tag + VALUE_STRUCTS[tag].pack(value)
+    if isinstance(value, float):
+        return b"f" + VALUE_STRUCTS[b"f"].pack(value)
+    if isinstance(value, STRING_TYPES):
+        return b"s" + encode_string(value)
+    if isinstance(value, tuple) and len(value) == 2:
+        return b"x" + encode_value(value[0]) + encode_value(value[1])
+    raise TypeError("Cannot encode argument {0!r}".format(value))
+
+
+def decode_value(data, offset):
+    """Decode an action argument and return (value, new offset)."""
+    tag, offset = data[offset:offset+1], offset + 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"s":
+        return decode_string(data, offset)
+    if tag == b"x":
+        x, offset = decode_value(data, offset)
+        y, offset = decode_value(data, offset)
+        return xytuple(x, y), offset
+    value_struct = VALUE_STRUCTS[tag]
+    value, = value_struct.unpack_from(data, offset)
+    return value, offset + value_struct.size
+
+
+def encode_arguments(args, kwargs):
+    """Encode the positional and keyword arguments of an action."""
+    data = [encode_value(arg) for arg in args]
+    for key, value in sorted(kwargs.items()):
+        data.append(encode_string(key))
+        data.append(encode_value(value))
+    return b"".join(data)
+
+
+def decode_arguments(data, offset, nargs, nkwargs):
+    """Decode the arguments of an action.
+
+    Return:
+        tuple: (args, kwargs, new offset)
+    """
+    args, kwargs = [], {}
+    for _ in range(nargs):
+        value, offset = decode_value(data, offset)
+        args.append(value)
+    for _ in range(nkwargs):
+        key, offset = decode_string(data, offset)
+        kwargs[key], offset = decode_value(data, offset)
+    return tuple(args), kwargs, offset
+
+
+# State class path
+def get_class_path(cls):
+    """Return the 'module:name' path of a class."""
+    return ":".join((cls.__module__, cls.__name__))
+
+
+def load_class(path):
+    """Load a class from its 'module:name' path."""
+    module, name = path.split(":")
+    return getattr(import_module(module), name)
+
+
+# Replay recorder
+class ReplayRecorder(object):
+    """Write the actions registered during a state to a replay file.
+
+    Args:
+        filename (str): path of the replay file
+        state_class (type): class of the recorded state
+
+    The recorder is created by the state when the **record** setting
+    is not empty. The setting is formatted with the following fields:
+     - **index**: number of recordings since the program started
+     - **state**: name of the state class
+    """
+
+    counter = count()
+
+    def __init__(self, filename, state_class):
+        """Open the file and write the header."""
+        self.file = open(filename, "wb")
+        self.names = {}
+        self.delta = None
+        self.closed = False
+        header = HEADER.pack(MAGIC, VERSION)
+        self.file.write(header + encode_string(get_class_path(state_class)))
+
+    @classmethod
+    def from_state(cls, state):
+        """Create a recorder for the given state, or return None
+        if the recording is disabled.
+        """
+        filename = state.control.settings.record
+        if not filename:
+            return None
+        index = next(cls.counter)
+        filename = filename.format(index=index, state=type(state).__name__)
+        return cls(filename, type(state))
+
+    def record_tick(self, tick, delta):
+        """Record the delta of a given tick if it changed.
+
+        Nothing is written once the recorder is closed.
+        """
+        if self.closed:
+            return
+        if delta != self.delta:
+            self.delta = delta
+            self.file.write(b"D" + DELTA.pack(tick, delta))
+
+    def record(self, tick, action, args, kwargs):
+        """Record an action registered at a given tick.
+
+        Nothing is written once the recorder is closed.
+        """
+        if self.closed:
+            return
+        code = self.names.get(action)
+        # Name definition
+        if code is None:
+            code = self.names[action] = len(self.names)
+            self.file.write(b"N" + LENGTH.pack(code) + encode_string(action))
+        # Action
+        data = ACTION.pack(tick, code, len(args), len(kwargs))
+        self.file.write(b"A" + data + encode_arguments(args, kwargs))
+
+    def close(self, tick):
+        """Write the end record and close the file."""
+        if not self.closed:
+            self.file.write(b"E" + END.pack(tick))
+            self.file.close()
+            self.closed = True
+
+
+# Replay reader
+class ReplayReader(object):
+    """Read a replay file.
+
+    Args:
+        filename (str): path of the replay file
+
+    Iterating over the reader generates the following tuples:
+     - ("delta", tick, delta)
+     - ("action", tick, action, args, kwargs)
+     - ("end", tick)
+    """
+
+    def __init__(self, filename):
+        """Load the file and read the header."""
+        with open(filename, "rb") as replay_file:
+            self.data = replay_file.read()
+        magic, version = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("'{0}' is not a valid replay".format(filename))
+        self.state_path, self.offset = decode_string(self.data, HEADER.size)
+
+    @property
+    def state_class(self):
+        """Class of the recorded state."""
+        return load_class(self.state_path)
+
+    def __iter__(self):
+        """Generate the records."""
+        data, offset, names = self.data, self.offset, {}
+        while offset < len(data):
+            kind, offset = data[offset:offset+1], offset + 1
+            if kind == b"N":
+                code, = LENGTH.unpack_from(data, offset)
+                names[code], offset = decode_string(data, offset + 1)
+            elif kind == b"D":
+                tick, delta = DELTA.unpack_from(data, offset)
+                offset += DELTA.size
+                yield "delta", tick, delta
+            elif kind == b"A":
+                tick, code, nargs, nkwargs = ACTION.unpack_from(data, offset)
+                offset += ACTION.size
+                args, kwargs, offset = decode_arguments(data, offset,
+                                                        nargs, nkwargs)
+                yield "action", tick, names[code], args, kwargs
+            elif kind == b"E":
+                tick, = END.unpack_from(data, offset)
+                yield "end", tick
+                return
+            else:
+                raise ValueError("Corrupted replay record")
+
+
+# Replay controller
+class ReplayController(BaseController):
+    """Controller feeding the actions of a replay file to the model.
+
+    The actions are registered at the same tick as they were recorded,
+    and the recorded delta is applied to the state before the model is
+    updated. The state stops at the end of the replay.
+
+    The user events are ignored, except for the quit events.
+    """
+
+    #: Path of the replay file
+    replay_file = None
+
+    def init(self):
+        """Open the replay and skip the records of the past ticks.
+
+        The position saved by a previous controller of the state is
+        used instead, if any.
+        """
+        if self.state.replay_position:
+            self.records, self.pending = self.state.replay_position
+            self.state.replay_position = None
+            return
+        self.records = iter(ReplayReader(self.replay_file))
+        self.pending = next(self.records, None)
+        while self.pending and self.pending[1] < self.state.tick_count:
+            self.handle_record(self.pending, register=False)
+            self.pending = next(self.records, None)
+
+    def _update(self):
+        """Handle the quit events and the records of the current tick."""
+        for ev in pg.event.get():
+            self._handle_event(ev)
+        tick = self.state.tick_count
+        while self.pending and self.pending[1] <= tick:
+            record, self.pending = self.pending, next(self.records, None)
+            if self.handle_record(record):
+                return True
+        return self.pending is None
+
+    def delete(self):
+        """Save the position in the replay for the state reload."""
+        self.state.replay_position = self.records, self.pending
+        BaseController.delete(self)
+
+    def handle_event(self, event):
+        """Ignore the user events."""
+        pass
+
+    def handle_record(self, record, register=True):
+        """Handle a replay record.
+
+        Return:
+            bool: True to stop the current state, False otherwise.
+        """
+        kind = record[0]
+        if kind == "delta":
+            self.state.current_fps = 1.0 / record[2]
+        elif kind == "action" and register:
+            _, _, action, args, kwargs = record
+            return self.register(action, *args, **kwargs)
+        elif kind == "end":
+            return True
+        return False
+
+
+# Replay state factory
+def replay_state(state_class, filename):
+    """Build a state class replaying the given file.
+
+    The state runs in headless mode unless specified otherwise.
+    """
+    attrs = {"replay_file": filename}
+    controller_class = type("Replay" + state_class.controller_class.__name__,
+                            (ReplayController,), attrs)
+
+    def __init__(self, control, headless=True):
+        state_class.__init__(self, control, headless)
+
+    attrs = {"controller_class": controller_class, "__init__": __init__,
+             "replay_position": None}
+    return type("Replay" + state_class.__name__, (state_class,), attrs)
+
+
+# Replay function
+def replay(control, filename, headless=True):
+    """Re-simulate a replay file and return the final state.
+
+    The state class is read from the replay file. A state pushed on the
+    stack during the replay (e.g. paused) is resumed right away.
+    """
+    state_class = ReplayReader(filename).state_class
+    state = replay_state(state_class, filename)(control, headless)
+    control.current_state = state
+    state.run()
+    # Resume the state after a pause
+    while state in control.state_stack:
+        state.clean()
+        control.state_stack.remove(state)
+        control.register_next_state(None)
+        state.reload()
+        state.run()
+    state.close_recorder()
+    return state
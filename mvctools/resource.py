@@ -34,6 +34,7 @@ class ResourceHandler:
         self._subdir_dict = {subdir: ResourceHandler(self._join(subdir))
                              for subdir in self._subdirs}
         self._resource_dict = defaultdict(dict)
+        self._cache_dict = {}
         # Sort files and dirs
         self._subdirs.sort()
         self._files.sort()
@@ -60,7 +61,7 @@ class ResourceHandler:
     
         
     def unload(self, recursive=True, threaded=False, callback=None):
-        unloaders = [self._resource_dict.clear]
+        unloaders = [self._resource_dict.clear, self._cache_dict.clear]
         if recursive:
             unloaders += [sub.unload for sub in self._subdir_dict.values()]
         iterator = (unloader() for unloader in unloaders)
@@ -117,6 +118,32 @@ class ResourceHandler:
         # Return default
         return default
 
+    def getpath(self, path, default=None):
+        """ Return the path of a resource file or directory """
+        # Parsing path
+        if isinstance(path, basestring):
+            path = os.path.normpath(path).split(os.path.sep)
+        # Directory case
+        if len(path) > 1:
+            subdir = self.getdir(path[0])
+            if subdir is None:
+                return default
+            return subdir.getpath(path[1:], default)
+        # Look for a directory, then a file
+        root, ext = os.path.splitext(path[0])
+        if root in self._subdir_dict:
+            return self._resource_path(root)
+        for r, e in self._files:
+            if r == root and e.startswith(ext):
+                return self._resource_path(r, e)
+        return default
+
+    def getcache(self, key, builder):
+        """ Return a resource derived from the files, built only once """
+        if key not in self._cache_dict:
+            self._cache_dict[key] = builder()
+        return self._cache_dict[key]
+
     def getdir(self, name, default=None):
         if name in self._subdir_dict:
             return self._subdir_dict[name]
@@ -228,6 +255,9 @@ class ResourceHandler:
         # Native image requested
         if size is None:
             image = pygame.image.load(self._resource_path(name))
+            # No display mode set (e.g. batch simulations)
+            if not pygame.display.get_surface():
+                return image
             return image.convert_alpha()
         # Get native image
         raw_image = self.getfile(name)
@@ -55,6 +55,14 @@ class BaseSettings(object):
         """Sound directory."""
         return "sound"
 
+    @default_setting(cast=str)
+    def atlas_dir(self):
+        """Directory to save the sprite atlases to.
+
+        The atlases are built at each start when empty.
+        """
+        return ""
+
     # Debug
 
     @default_setting(cast=float)
@@ -83,6 +91,107 @@ class BaseSettings(object):
         """Display the frame rate."""
         return False
 
+    @default_setting(cast=bool,
+                     from_string=bool_from_string,
+                     to_string=bool_to_string)
+    def display_timings(self):
+        """Display the frame time percentiles of each phase."""
+        return False
+
+    # Pacing
+
+    @default_setting(cast=bool,
+                     from_string=bool_from_string,
+                     to_string=bool_to_string)
+    def precise_pacing(self):
+        """Limit the frame rate with a sleep followed by a busy wait."""
+        return False
+
+    @default_setting(cast=float)
+    def spin_budget(self):
+        """Duration of the busy wait for the precise pacing, in seconds."""
+        return 0.002
+
+    @default_setting(cast=bool,
+                     from_string=bool_from_string,
+                     to_string=bool_to_string)
+    def render_thread(self):
+        """Draw each frame on a worker thread while the next frame is
+        simulated.
+
+        The sprites are updated from the model on the main thread, then
+        the drawing of the main view and the scaling run concurrently
+        with the next controller and model updates.
+        """
+        return False
+
+    @default_setting(cast=float)
+    def idle_timeout(self):
+        """Maximum time to wait for an event when nothing is changing,
+        in seconds.
+
+        The states tick at the frame rate as long as the model is not
+        idle or the view redraws something. Otherwise, they block until
+        an event occurs or a sprite registered a redraw (e.g. the next
+        image of an animation), and the waited time is simulated at
+        once. The idle mode is disabled when set to 0.
+        """
+        return 0
+
+    # Simulation
+
+    @default_setting(cast=bool,
+                     from_string=bool_from_string,
+                     to_string=bool_to_string)
+    def headless(self):
+        """Run the states without display, using a fixed time step."""
+        return False
+
+    @default_setting(cast=int)
+    def sim_fps(self):
+        """Fixed simulation rate, independent of the display rate.
+
+        The views are rendered with an interpolation between the last
+        two simulation ticks. The simulation follows the display rate
+        when set to 0.
+        """
+        return 0
+
+    @default_setting(cast=float)
+    def max_delta(self):
+        """Maximum time step of a frame, in seconds.
+
+        Slower frames are simulated in slow motion.
+        There is no limit when set to 0, the default.
+        """
+        return 0
+
+    @default_setting(cast=int)
+    def max_steps(self):
+        """Maximum number of simulation ticks per frame.
+
+        Only used with a fixed simulation rate. The time that cannot
+        be simulated is dropped. There is no limit when set to 0.
+        """
+        return 5
+
+    @default_setting(cast=int)
+    def render_period(self):
+        """Ticks between two off-screen renderings in headless mode.
+
+        The view is never rendered when set to 0.
+        """
+        return 0
+
+    @default_setting(cast=str)
+    def record(self):
+        """Replay file to record the registered actions to.
+
+        The name is formatted with the 'index' and 'state' fields.
+        The actions are not recorded when empty.
+        """
+        return ""
+
     # Settings
 
     @default_setting(cast=int)
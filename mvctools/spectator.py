@@ -0,0 +1,295 @@
+"""Module to stream the state of a model to spectators over UDP.
+
+The streamed state is a fixed list of integer fields (e.g. positions,
+flags and scores) extracted from the model at every tick. The server
+encodes the changes since the previous tick once, and sends the same
+packet to all the spectators: the cost of a spectator is a single send
+call per tick. A keyframe containing all the fields is sent periodically
+and to the new spectators, so a lost packet only freezes a spectator
+until the next keyframe.
+
+The packets start with a magic string:
+ - **hello**: sent periodically by the spectators to subscribe
+ - **frame**: followed by the session, the tick, the base tick (equal to
+   the tick for the keyframes), the bit mask of the changed fields and
+   their values
+
+The session changes when the ticks of the server start over (e.g. for
+a new match), so the spectators accept the keyframes of the new session
+even though their ticks are lower.
+"""
+
+# Imports
+import struct
+import socket
+import random
+from timeit import default_timer
+
+
+# Format
+HELLO = b"MVCH"
+FRAME = b"MVCF"
+HEADER = struct.Struct("<4sHIII")
+
+
+# Delta codec
+class DeltaCodec(object):
+    """Encode the changes between two lists of integer fields.
+
+    Args:
+        formats (str): struct format character of each field (up to 32)
+    """
+
+    def __init__(self, formats):
+        """Check the formats."""
+        if len(formats) > 32:
+            raise ValueError("Too many fields")
+        self.formats = formats
+        self.full = (1 << len(formats)) - 1
+        self.structs = {}
+
+    def get_struct(self, mask):
+        """Return the struct of the fields in a bit mask."""
+        result = self.structs.get(mask)
+        if result is None:
+            fmt = "".join(char for index, char in enumerate(self.formats)
+                          if mask >> index & 1)
+            result = self.structs[mask] = struct.Struct("<" + fmt)
+        return result
+
+    def encode(self, tick, values, previous=None, session=0):
+        """Encode the values of a tick.
+
+        Args:
+            tick (int): the current tick
+            values (list): the values of the fields
+            previous (list): the values of the previous tick, or None
+                             to encode a keyframe
+            session (int): the session of the stream (16 bits)
+        """
+        if previous is None:
+            mask, base, changed = self.full, tick, values
+        else:
+            mask, base, changed = 0, tick - 1, []
+            for index, (value, old) in enumerate(zip(values, previous)):
+                if value != old:
+                    mask |= 1 << index
+                    changed.append(value)
+        header = HEADER.pack(FRAME, session, tick, base, mask)
+        return header + self.get_struct(mask).pack(*changed)
+
+    def decode(self, data):
+        """Decode a frame packet.
+
+        Return:
+            tuple: session, tick, base tick and a dictionary of
+                   changed values
+        Raise:
+            ValueError: if the packet is not valid
+        """
+        try:
+            magic, session, tick, base, mask = HEADER.unpack_from(data, 0)
+            if magic != FRAME or mask & ~self.full:
+                raise ValueError("Invalid frame")
+            values = self.get_struct(mask).unpack_from(data, HEADER.size)
+        except struct.error:
+            raise ValueError("Corrupted frame")
+        indexes = (index for index in range(len(self.formats))
+                   if mask >> index & 1)
+        return session, tick, base, dict(zip(indexes, values))
+
+
+# Spectator server
+class SpectatorServer(object):
+    """Broadcast the fields of a model to the subscribed spectators.
+
+    Args:
+        address (tuple): local (host, port) to bind
+        formats (str): struct format character of each field
+        clock (callable): time function (default is timeit.default_timer)
+
+    A spectator is dropped when it stops sending hello packets for
+    **timeout** seconds. The session starts at a random value and
+    changes when a tick is not greater than the previous one. The following statistics are available:
+     - **frames**: number of broadcast ticks
+     - **packets**: number of packets sent
+     - **bytes**: number of bytes sent
+    """
+
+    #: Ticks between two keyframes
+    keyframe_period = 60
+    #: Maximum number of spectators
+    max_spectators = 64
+    #: Spectator timeout, in seconds
+    timeout = 5.0
+    buffer_size = 64
+
+    def __init__(self, address, formats, clock=default_timer):
+        """Bind the socket."""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+        self.codec = DeltaCodec(formats)
+        self.clock = clock
+        self.spectators = {}
+        self.joining = set()
+        self.previous = None
+        self.last_tick = None
+        self.session = random.randrange(1 << 16)
+        self.frames = 0
+        self.packets = 0
+        self.bytes = 0
+
+    def accept(self):
+        """Read the hello packets of the spectators."""
+        now = self.clock()
+        while True:
+            try:
+                data, address = self.socket.recvfrom(self.buffer_size)
+            except socket.error:
+                break
+            if data != HELLO:
+                continue
+            if address not in self.spectators:
+                if len(self.spectators) >= self.max_spectators:
+                    continue
+                self.joining.add(address)
+            self.spectators[address] = now
+        for address, last in list(self.spectators.items()):
+            if now - last > self.timeout:
+                del self.spectators[address]
+                self.joining.discard(address)
+
+    def broadcast(self, tick, values):
+        """Send the values of a tick to all the spectators."""
+        self.accept()
+        # The ticks start over
+        if self.last_tick is not None and tick <= self.last_tick:
+            self.session = (self.session + 1) % (1 << 16)
+        keyframe = (self.previous is None or tick != self.last_tick + 1 or
+                    tick % self.keyframe_period == 0)
+        previous = None if keyframe else self.previous
+        data = self.codec.encode(tick, values, previous, self.session)
+        full = data if keyframe else None
+        for address in self.spectators:
+            if address in self.joining:
+                if full is None:
+                    full = self.codec.encode(tick, values,
+                                             session=self.session)
+                self.send(full, address)
+            else:
+                self.send(data, address)
+        self.joining.clear()
+        self.previous = values
+        self.last_tick = tick
+        self.frames += 1
+
+    def send(self, data, address):
+        """Send a packet to a spectator."""
+        try:
+            self.socket.sendto(data, address)
+        except socket.error:
+            return
+        self.packets += 1
+        self.bytes += len(data)
+
+    def close(self):
+        """Close the socket."""
+        self.socket.close()
+
+
+# Spectator client
+class SpectatorClient(object):
+    """Receive the fields of a model from a spectator server.
+
+    Args:
+        server (tuple): (host, port) of the server
+        formats (str): struct format character of each field
+        address (tuple): local (host, port) to bind (default is any)
+        clock (callable): time function (default is timeit.default_timer)
+
+    The deltas are applied only on top of the previous tick: after a lost
+    packet, the values are frozen until the next keyframe. The number of
+    such lost ticks is available as **lost**. A keyframe of another
+    session is always applied, and starts the new session.
+    """
+
+    #: Period of the hello packets, in seconds
+    hello_period = 1.0
+    buffer_size = 1024
+
+    def __init__(self, server, formats, address=("", 0),
+                 clock=default_timer):
+        """Bind the socket."""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+        self.server = server
+        self.codec = DeltaCodec(formats)
+        self.clock = clock
+        self.last_hello = None
+        self.values = None
+        self.session = None
+        self.tick = None
+        self.received = 0
+        self.lost = 0
+
+    def hello(self):
+        """Subscribe to the server, if the last hello is too old."""
+        now = self.clock()
+        if self.last_hello is not None and \
+           now - self.last_hello < self.hello_period:
+            return
+        self.last_hello = now
+        try:
+            self.socket.sendto(HELLO, self.server)
+        except socket.error:
+            pass
+
+    def receive(self):
+        """Read the frames from the server.
+
+        Return:
+            list: the values of the fields if they changed, None otherwise
+        """
+        self.hello()
+        changed = False
+        while True:
+            try:
+                data, address = self.socket.recvfrom(self.buffer_size)
+            except socket.error:
+                break
+            try:
+                session, tick, base, values = self.codec.decode(data)
+            except ValueError:
+                continue
+            self.received += 1
+            changed = self.apply(tick, base, values, session) or changed
+        return self.values if changed else None
+
+    def apply(self, tick, base, values, session=0):
+        """Apply a decoded frame and return True if it was used."""
+        # New session
+        if tick == base and session != self.session:
+            self.session = session
+            self.tick = None
+        # Keyframe
+        if tick == base:
+            if self.tick is not None and tick <= self.tick:
+                return False
+            if self.tick is not None:
+                self.lost += tick - self.tick - 1
+            self.values = [values[index] for index in range(len(values))]
+        # Delta on top of the current values
+        elif session == self.session and base == self.tick:
+            for index, value in values.items():
+                self.values[index] = value
+        else:
+            return False
+        self.tick = tick
+        return True
+
+    def close(self):
+        """Close the socket."""
+        self.socket.close()
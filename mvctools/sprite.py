@@ -3,6 +3,7 @@ from pygame.sprite import DirtySprite
 from pygame import Rect, Surface, transform
 from mvctools.common import xytuple, cachedict, scale_dirty
 from mvctools import BaseView
+from mvctools.atlas import get_atlas
 
 
 class AutoSprite(DirtySprite):
@@ -96,6 +97,12 @@ class AutoSprite(DirtySprite):
         size = self.size if resize else None
         return Animation(resource, timer, inf, sup, looping, size)
 
+    def build_atlas(self, name, builder, sources=(), params=None):
+        directory = self.settings.atlas_dir
+        paths = [self.resource.getpath(source) for source in sources]
+        return get_atlas(self.resource, name, builder, directory,
+                         paths, params)
+
     def scale_resource(self, resource, name, size=None):
         size = self.size if size is None else None
         return resource.getfile(name, size)
@@ -219,7 +226,8 @@ class ViewSprite(AutoSprite):
             if self.image.get_size() != self.size:
                 self.image = Surface(self.size, screen.get_flags())
             # Scale dirty
-            dirty = scale_dirty(screen, self.image, dirty)
+            dirty = self.state.frame_timer.timed(
+                "scale", scale_dirty, screen, self.image, dirty)
             return self.image, dirty
         # Not scalable screen
         image = Surface(self.size, screen.get_flags())
@@ -289,6 +297,7 @@ class Animation(object):
     def get(self):
         normalized = (self.timer.get() - self.inf) / (self.sup - self.inf)
         index = int(normalized * len(self))
+        self.register_redraw(index)
         if self.looping:
             index %= len(self)
         elif normalized >= 1:
@@ -297,6 +306,18 @@ class Animation(object):
             index = 0
         return self[index]
 
+    def register_redraw(self, index):
+        """Register the next image change to the state."""
+        step = float(self.sup - self.inf) / len(self)
+        values = [self.inf + index*step, self.inf + (index+1)*step]
+        if not self.looping:
+            values = [min(max(value, self.inf), self.sup)
+                      for value in values]
+        delays = [self.timer.get_delay(value) for value in values]
+        delays = [delay for delay in delays if delay is not None]
+        if delays:
+            self.timer.state.register_redraw(min(delays))
+
     def __len__(self):
         return len(self.resource)
 
@@ -1,10 +1,13 @@
 
 import pygame, gc
 from collections import deque
-from mvctools.model import BaseModel
+from mvctools.model import BaseModel, UpdateSchedule
 from mvctools.controller import BaseController
 from mvctools.view import BaseView
 from mvctools.common import scale_dirty
+from mvctools.replay import ReplayRecorder
+from mvctools.timing import FrameTimer, Pacer
+from mvctools.pipeline import RenderThread
 
 
 class NextStateException(Exception):
@@ -29,69 +32,222 @@ class BaseState(object):
     view_class = BaseView
     clock_class = pygame.time.Clock
 
-    def __init__(self, control):
+    def __init__(self, control, headless=None):
         self.control = control
+        settings = self.control.settings
+        self.headless = settings.headless if headless is None else headless
+        self.render_period = settings.render_period
+        self.offscreen = None
+        self.tick_count = 0
+        self.frame_timer = FrameTimer()
+        self.clock = None
+        self.renderer = None
+        self.last_dirty = None
+        self.redraw_delay = None
+        self.reset_requested = False
+        self.recorder = self.create_recorder()
         self.model = self.model_class(self)
-        self.controller = self.controller_class(self, self.model)
+        self.update_schedule = UpdateSchedule(self.model)
+        self.controller = self.create_controller()
         self.view = self.view_class(self, self.model)
+        self.create_overlay()
         self.current_fps = None
+        self.interpolation = 1.0
         self.ticking = False
 
     def clean(self):
+        # A stacked state is reloaded later and keeps recording
+        if self not in self.control.state_stack:
+            self.close_recorder()
         self.view.delete()
+        self.controller.delete()
         self.controller = None
         self.view = None
         gc.collect()
 
     def reload(self):
-        self.controller = self.controller_class(self, self.model)
+        self.controller = self.create_controller()
         self.view = self.view_class(self, self.model)
+        self.create_overlay()
         self.current_fps = None
+        self.interpolation = 1.0
         self.ticking = False
+        self.last_dirty = None
 
-    def tick(self):
-        mvc = self.controller, self.model, self.view
+    def create_controller(self):
+        """Create the controller registering the actions to the model."""
+        return self.controller_class(self, self.model)
+
+    def create_recorder(self):
+        """Create the replay recorder, if enabled by the settings."""
+        return ReplayRecorder.from_state(self)
+
+    def reset(self):
+        """Restore the model to its initial configuration.
+
+        The controller, the views and the resource caches are kept,
+        so this is much cheaper than instantiating a new state.
+        """
+        self.reset_requested = False
+        self.model.reinit()
+        self.controller.reset()
+        self.interpolation = 1.0
+
+    def register_reset(self):
+        """Reset the state after the current model update.
+
+        Unlike **reset**, it can be called in the middle of an update.
+        """
+        self.reset_requested = True
+
+    def register_redraw(self, delay):
+        """Register a change of the view after a delay, in seconds.
+
+        Called by the sprites while updating. The idle mode wakes up
+        in time to draw the change.
+        """
+        if self.redraw_delay is None or delay < self.redraw_delay:
+            self.redraw_delay = delay
+
+    def create_overlay(self):
+        if self.control.settings.display_timings and not self.headless:
+            from mvctools.utils.timing import TimingSprite
+            TimingSprite(self.view)
+
+    def tick(self, steps=1):
+        timed = self.frame_timer.timed
         with TickContext(self):
-            return self.controller._update() or \
-                   self.model._update() or \
-                   self.update_view()
+            if timed("controller", self.controller._update):
+                return True
+            for _ in range(steps):
+                if timed("model", self.update_model):
+                    return True
+            return self.update_view()
         return True
 
+    def update_model(self):
+        delta = self.delta
+        if self.recorder:
+            self.recorder.record_tick(self.tick_count, delta)
+        self.model._update_delta(delta)
+        try:
+            result = self.update_schedule.run()
+        finally:
+            self.tick_count += 1
+        if self.reset_requested:
+            self.reset()
+        return result
+
+    def close_recorder(self):
+        if self.recorder:
+            self.recorder.close(self.tick_count)
+
     def update_view(self):
+        self.redraw_delay = None
+        # Headless mode
+        if self.headless:
+            return self.render_offscreen()
+        # Pipelined mode
+        if self.renderer:
+            return self.update_view_pipelined()
         # Get the screens
         actual_screen = self.get_surface()
         screen, dirty = self.view._update()
         # Scale
+        timed = self.frame_timer.timed
         if actual_screen != screen:
-            dirty = scale_dirty(screen, actual_screen, dirty)
+            dirty = timed("scale", scale_dirty, screen, actual_screen, dirty)
         # Update
-        pygame.display.update(dirty)
+        timed("display", pygame.display.update, dirty)
+        self.last_dirty = dirty
+
+    def update_view_pipelined(self):
+        # Display the previous frame
+        self.finish_render()
+        # Copy the model state into the sprites
+        screen = self.frame_timer.timed("sprites", self.view._sync)
+        # Draw while the next frame is simulated
+        self.renderer.submit(self.render, screen, self.get_surface())
+
+    def render(self, screen, actual_screen):
+        # Called from the render thread
+        dirty = self.view._draw()
+        if actual_screen != screen:
+            dirty = scale_dirty(screen, actual_screen, dirty)
+        return dirty
+
+    def finish_render(self):
+        # Wait for the render thread and display its frame
+        if not self.renderer or not self.renderer.pending:
+            return
+        timed = self.frame_timer.timed
+        dirty = timed("draw", self.renderer.wait)
+        timed("display", pygame.display.update, dirty)
+        self.last_dirty = dirty
+
+    def close_renderer(self):
+        if self.renderer:
+            try:
+                self.finish_render()
+            finally:
+                self.renderer.close()
+                self.renderer = None
+
+    def render_offscreen(self):
+        # Render every few ticks, if ever
+        period = self.render_period
+        if period and not self.tick_count % period:
+            self.view._update()
 
     def get_surface(self):
-        return pygame.display.get_surface()
+        if not self.headless:
+            return pygame.display.get_surface()
+        if self.offscreen is None:
+            self.offscreen = pygame.Surface(self.control.settings.size)
+        return self.offscreen
 
     @property
     def delta(self):
         return 1.0 / self.current_fps
 
     def run(self):
+        # Headless mode
+        if self.headless:
+            return self.run_headless()
+        # Pipelined mode
+        if self.control.settings.render_thread:
+            self.renderer = RenderThread()
+        try:
+            return self.run_loop()
+        finally:
+            self.close_renderer()
+
+    def run_loop(self):
         # Get settings
         string = None
         limit_fps = float(self.control.settings.fps)
+        sim_fps = float(self.control.settings.sim_fps)
+        max_delta = float(self.control.settings.max_delta)
+        max_steps = self.control.settings.max_steps
         debug_speed = float(self.control.settings.debug_speed)
+        idle_timeout = float(self.control.settings.idle_timeout)
         if self.control.settings.display_fps:
             string = self.control.window_title + "   FPS = {:3}"
         # Init time
         queue = deque(maxlen=3)
-        clock = self.clock_class()
+        clock = self.clock = self.create_clock()
+        timer = self.frame_timer
         # Freeze current fps for the first two ticks
-        self.current_fps = limit_fps
+        self.current_fps = sim_fps or limit_fps
         if self.tick():
             return
+        # Fixed time step
+        accumulator, steps = 0.0, 1
         # Time control
         tick = limit_fps
         tick *= debug_speed
-        millisec = clock.tick(tick)
+        millisec = timer.timed("wait", clock.tick, tick)
+        timer.end_frame()
         # Profile
         if self.control.settings.profile:
             import cProfile, pstats
@@ -99,13 +255,37 @@ class BaseState(object):
             profiler.enable()
             clock.tick()
         # Loop over the state ticks
-        while not self.tick():
+        while not self.tick(steps):
+            # Block while nothing is changing
+            idle = idle_timeout and self.is_idle()
+            if idle:
+                timeout = idle_timeout
+                if self.redraw_delay is not None:
+                    timeout = min(timeout, self.redraw_delay / debug_speed)
+                self.wait_event(timeout)
+                timer.count("idle")
             # Time control
-            millisec = clock.tick(tick)
+            millisec = timer.timed("wait", clock.tick, tick)
+            timer.end_frame()
+            # Limit the time step, unless it includes an idle wait
+            elapsed = millisec * debug_speed / 1000.0
+            if max_delta and elapsed > max_delta and not idle:
+                elapsed = max_delta
+                timer.count("max_delta")
+            # Accumulate the elapsed time into fixed steps
+            if sim_fps:
+                accumulator += elapsed * sim_fps
+                steps = int(accumulator)
+                accumulator -= steps
+                if max_steps and steps > max_steps and not idle:
+                    steps = max_steps
+                    timer.count("max_steps")
+                self.interpolation = accumulator
             # Update current FPS
-            if millisec:
-                queue.append(1000.0/millisec)
-                queue[-1] /= debug_speed
+            elif elapsed:
+                if idle:
+                    queue.clear()
+                queue.append(1.0/elapsed)
                 # Median filter of size 3
                 new_fps = sorted(queue)[len(queue)//2]
                 self.current_fps = new_fps
@@ -120,3 +300,52 @@ class BaseState(object):
             ps = pstats.Stats(profiler).sort_stats('tottime')
             ps.print_stats()
 
+    def is_idle(self):
+        """Return True if the last frame drew nothing and the model
+        is not changing by itself.
+
+        The sprites register the delay before their next change, if any
+        (see **register_redraw**).
+        """
+        if self.headless or not self.model.is_idle():
+            return False
+        self.finish_render()
+        return self.last_dirty == []
+
+    def wait_event(self, timeout):
+        """Block until an event occurs or the timeout expires.
+
+        The event is posted back to the queue for the controller.
+        Nothing is done before pygame 2, since its event wait has no
+        timeout.
+        """
+        millisec = int(timeout * 1000)
+        # A null timeout would wait forever
+        if millisec <= 0:
+            return
+        try:
+            event = self.frame_timer.timed("wait", pygame.event.wait,
+                                           millisec)
+        # No timeout before pygame 2
+        except TypeError:
+            return
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
+
+    def create_clock(self):
+        """Create the clock limiting the frame rate."""
+        settings = self.control.settings
+        clock_class = Pacer if settings.precise_pacing else self.clock_class
+        if isinstance(clock_class, type) and issubclass(clock_class, Pacer):
+            return clock_class(settings.spin_budget)
+        return clock_class()
+
+    def run_headless(self, max_ticks=None):
+        # Fixed time step
+        settings = self.control.settings
+        self.current_fps = float(settings.sim_fps or settings.fps)
+        # Loop over the state ticks without waiting
+        while max_ticks is None or self.tick_count < max_ticks:
+            if self.tick():
+                return True
+            self.frame_timer.end_frame()
@@ -0,0 +1,215 @@
+"""Module providing the frame pacing and the instrumentation of the ticks."""
+
+# Imports
+from time import sleep
+from timeit import default_timer
+
+
+# Ring buffer
+class RingBuffer(object):
+    """Fixed-size buffer keeping the last appended values.
+
+    Args:
+        size (int): maximum number of values
+    """
+
+    def __init__(self, size):
+        """Initialize the buffer."""
+        self.values = [0.0] * size
+        self.size = size
+        self.index = 0
+        self.length = 0
+
+    def append(self, value):
+        """Append a value, overwriting the oldest one if necessary."""
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.length = min(self.length + 1, self.size)
+
+    def get_values(self):
+        """Return the list of values, from the oldest to the newest."""
+        if self.length < self.size:
+            return self.values[:self.length]
+        return self.values[self.index:] + self.values[:self.index]
+
+    def percentiles(self, *ratios):
+        """Return the percentiles for the given ratios (between 0 and 1).
+
+        The nearest-rank method is used. Zeros are returned if the
+        buffer is empty.
+        """
+        values = sorted(self.get_values())
+        if not values:
+            return tuple(0.0 for _ in ratios)
+        last = len(values) - 1
+        return tuple(values[min(last, int(ratio * len(values)))]
+                     for ratio in ratios)
+
+    def __len__(self):
+        return self.length
+
+
+# Frame timer
+class FrameTimer(object):
+    """Record the wall time spent in each phase of the frames.
+
+    Args:
+        size (int): number of frames to keep (default is 600)
+
+    The time is partitioned between phases: entering a phase stops the
+    timing of the previous one. Nested phases are thus exclusive, e.g.
+    the drawing of a sub-view is counted in the **draw** phase and not
+    in the **sprites** phase of the parent view.
+
+    The phases are the following:
+     - **controller**: event processing
+     - **model**: model update
+     - **sprites**: sprite synchronization and update
+     - **draw**: drawing of the sprite groups
+     - **scale**: scaling of the screens
+     - **display**: update of the display
+     - **wait**: frame rate control
+     - **other**: anything else
+
+    The total duration of each frame is also available as **frame**.
+
+    The timer also holds event counters, e.g. how many times the frame
+    rate limits were hit.
+    """
+
+    phases = ("controller", "model", "sprites", "draw",
+              "scale", "display", "wait", "other")
+
+    #: Percentiles to report
+    ratios = 0.5, 0.95, 0.99
+
+    def __init__(self, size=600):
+        """Initialize the buffers."""
+        self.buffers = {phase: RingBuffer(size)
+                        for phase in self.phases + ("frame",)}
+        self.current = dict.fromkeys(self.phases, 0.0)
+        self.counters = {}
+        self.phase = "other"
+        self.mark = default_timer()
+        self.frame_start = self.mark
+
+    def enter(self, phase):
+        """Enter a new phase and return the previous one."""
+        now = default_timer()
+        self.current[self.phase] += now - self.mark
+        self.mark = now
+        previous, self.phase = self.phase, phase
+        return previous
+
+    def timed(self, phase, func, *args):
+        """Call a function within a given phase and return its result."""
+        previous = self.enter(phase)
+        try:
+            return func(*args)
+        finally:
+            self.enter(previous)
+
+    def count(self, name):
+        """Increment the counter of a given event."""
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def end_frame(self):
+        """Save the durations of the current frame."""
+        self.enter(self.phase)
+        for phase, value in self.current.items():
+            self.buffers[phase].append(value)
+            self.current[phase] = 0.0
+        self.buffers["frame"].append(self.mark - self.frame_start)
+        self.frame_start = self.mark
+
+    def percentiles(self, phase):
+        """Return the (p50, p95, p99) durations of a phase in seconds."""
+        return self.buffers[phase].percentiles(*self.ratios)
+
+    def report(self):
+        """Return a dictionary of (p50, p95, p99) durations per phase."""
+        return {phase: self.percentiles(phase) for phase in self.buffers}
+
+    def __len__(self):
+        return len(self.buffers["frame"])
+
+
+# Pacer
+class Pacer(object):
+    """Frame rate limiter with a sub-millisecond precision.
+
+    Args:
+        spin_budget (float): duration of the final busy wait in seconds
+                             (default is 0.002)
+        size (int): number of frames to keep for the statistics
+                    (default is 600)
+
+    It can replace **pygame.time.Clock**: the OS sleep (with its
+    millisecond granularity) stops **spin_budget** seconds before the
+    deadline, and a busy wait on the high resolution timer finishes the
+    frame. The deadlines are phase-locked, so the rounding errors do not
+    accumulate as long as the frames are on time. A late frame resets
+    the phase instead of shortening the following frames.
+    """
+
+    spin_budget = 0.002
+
+    def __init__(self, spin_budget=None, size=600):
+        """Initialize the statistics."""
+        if spin_budget is not None:
+            self.spin_budget = spin_budget
+        self.intervals = RingBuffer(size)
+        self.deviations = RingBuffer(size)
+        self.last_tick = None
+        self.deadline = None
+
+    def tick(self, framerate=0):
+        """Wait for the next frame and return the elapsed milliseconds
+        since the previous call.
+
+        Args:
+            framerate (float): frame rate limit, or 0 for no limit
+        """
+        now = default_timer()
+        if self.last_tick is None:
+            self.last_tick = self.deadline = now
+        if framerate:
+            period = 1.0 / framerate
+            deadline = self.deadline + period
+            # Late frame: start over from now
+            if deadline < now:
+                deadline = now
+            # Sleep then spin
+            remaining = deadline - now - self.spin_budget
+            if remaining > 0:
+                sleep(remaining)
+            while default_timer() < deadline:
+                pass
+            now = default_timer()
+            # Missed deadline (e.g. preemption): do not catch up
+            self.deadline = deadline
+            if now - deadline > self.spin_budget:
+                self.deadline = now
+            self.deviations.append(abs(now - self.last_tick - period))
+        else:
+            self.deadline = now
+        interval, self.last_tick = now - self.last_tick, now
+        self.intervals.append(interval)
+        return 1000.0 * interval
+
+    def get_time(self):
+        """Return the duration of the last frame in milliseconds."""
+        values = self.intervals.get_values()
+        return 1000.0 * values[-1] if values else 0.0
+
+    def get_fps(self):
+        """Return the average frame rate over the last 10 frames."""
+        values = self.intervals.get_values()[-10:]
+        total = sum(values)
+        return len(values) / total if total else 0.0
+
+    def jitter(self):
+        """Return the (p50, p95, p99) deviations of the frame durations
+        from the frame rate limit, in seconds.
+        """
+        return self.deviations.percentiles(*FrameTimer.ratios)
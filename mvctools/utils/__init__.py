@@ -10,3 +10,4 @@ from mvctools.utils.mapping import PlayerController, TwoPlayersController
 from mvctools.utils.mapping import PlayerAction
 from mvctools.utils.menu import MenuModel, MenuView, EntryModel
 from mvctools.utils.menu import MenuSprite, EntryModel, EntrySprite
+from mvctools.utils.timing import TimingSprite
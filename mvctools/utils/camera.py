@@ -3,11 +3,15 @@ from mvctools.model import BaseModel
 from mvctools.view import BaseView
 from pygame import Surface, Rect
 from mvctools import xytuple
+from mvctools.common import interpolate_rect
 
 class CameraModel(BaseModel):
 
     camera_speed = None
 
+    snapshot_fields = BaseModel.snapshot_fields + \
+        ("camera_rect", "target_rect", "old_camera_rect")
+
     def init_camera(self, rect, speed=None):
         self.base_rect = Rect(rect)
         self.camera_rect = Rect(rect)
@@ -31,6 +35,11 @@ class CameraModel(BaseModel):
     def is_camera_set(self):
         return not self.target_rect == self.base_rect
 
+    def is_idle(self):
+        if self.camera_rect != self.target_rect or self.camera_changed:
+            return False
+        return BaseModel.is_idle(self)
+
     def post_update(self):
         # Save current
         self.old_camera_rect = self.camera_rect
@@ -66,6 +75,8 @@ class CameraModel(BaseModel):
 
 class CameraSprite(ViewSprite):
 
+    displayed_rect = None
+
     @property
     def size(self):
         return self.parent.screen_size
@@ -73,24 +84,41 @@ class CameraSprite(ViewSprite):
     def get_rect(self):
         return self.image.get_rect()
 
+    def get_camera_rect(self, screen_rect):
+        """Return the camera rectangle to display.
+
+        It is interpolated between the last two simulation ticks.
+        """
+        ratio = self.state.interpolation
+        rect = interpolate_rect(
+            self.model.old_camera_rect, self.model.camera_rect, ratio)
+        return rect.clamp(screen_rect)
+
     def transform(self, screen, dirty):
+        # Interpolate the camera
+        camera_rect = self.get_camera_rect(screen.get_rect())
+        camera_changed = camera_rect != self.displayed_rect
+        self.displayed_rect = camera_rect
         # No update needed
-        if not dirty and not self.model.camera_changed:
+        if not dirty and not camera_changed:
             return self.image, None
         # Crop the screen with the camera rectangle
-        if self.model.camera_rect != screen.get_rect():
-            cropped = screen.subsurface(self.model.camera_rect)
+        if camera_rect != screen.get_rect():
+            cropped = screen.subsurface(camera_rect)
             return ViewSprite.transform(self, cropped, None)
         # Update needed
-        if self.model.camera_changed:
+        if camera_changed:
             self.set_dirty()
             dirty = None
         return ViewSprite.transform(self, screen, dirty)
 
     def convert_position(self, pos):
+        camera_rect = self.displayed_rect
+        if camera_rect is None:
+            camera_rect = self.model.camera_rect
         new_pos = ViewSprite.convert_position(self, pos)
         new_pos /= self.view.screen_size
-        new_pos *= self.model.camera_rect.size
-        return new_pos + self.model.camera_rect.topleft
+        new_pos *= camera_rect.size
+        return new_pos + camera_rect.topleft
 
 
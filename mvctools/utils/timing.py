@@ -0,0 +1,74 @@
+"""Overlay displaying the frame timings of the current state."""
+
+# Imports
+import pygame as pg
+from pygame import Color, Surface
+from mvctools.sprite import AutoSprite
+
+
+# Timing sprite
+class TimingSprite(AutoSprite):
+    """Sprite displaying the p50/p95/p99 durations of each phase,
+    followed by the pacer jitter (if any) and the event counters.
+
+    It is created by the state when the **display_timings** setting
+    is enabled. The text is refreshed every **refresh_period** frames
+    to keep the overlay itself out of the measurements.
+    """
+
+    # Font
+    font_size = 14
+    color = "white"
+    background = 0, 0, 0, 160
+    # Layout
+    pos = 2, 2
+    margin = 2
+    column_width = 40
+    overlay_layer = 1000
+    # Refresh
+    refresh_period = 30
+
+    def init(self):
+        if not pg.font.get_init():
+            pg.font.init()
+        self.font = pg.font.Font(None, self.font_size)
+        self.count = 0
+
+    def get_lines(self):
+        timer = self.state.frame_timer
+        yield ("ms", "p50", "p95", "p99")
+        for phase in timer.phases + ("frame",):
+            values = timer.percentiles(phase)
+            yield (phase,) + tuple("{0:.2f}".format(1000 * value)
+                                   for value in values)
+        jitter = getattr(self.state.clock, "jitter", None)
+        if jitter:
+            yield ("jitter",) + tuple("{0:.2f}".format(1000 * value)
+                                      for value in jitter())
+        for name, value in sorted(timer.counters.items()):
+            yield (name, str(value), "", "")
+
+    def get_image(self):
+        self.count += 1
+        if self.count % self.refresh_period != 1:
+            return self.image
+        lines = list(self.get_lines())
+        height = self.font.get_linesize()
+        columns = len(lines[0]) + 1
+        size = (self.column_width * columns + 2 * self.margin,
+                height * len(lines) + 2 * self.margin)
+        image = Surface(size, pg.SRCALPHA)
+        image.fill(Color(*self.background))
+        for i, line in enumerate(lines):
+            for j, text in enumerate(line):
+                x = self.margin + self.column_width * (j + 1 if j else 0)
+                y = self.margin + height * i
+                surface = self.font.render(text, True, Color(self.color))
+                image.blit(surface, (x, y))
+        return image
+
+    def get_rect(self):
+        return self.image.get_rect(topleft=self.pos)
+
+    def get_layer(self):
+        return self.overlay_layer
@@ -4,10 +4,11 @@ import pygame as pg
 from pygame.sprite import LayeredDirty, DirtySprite
 from pygame import Rect, Surface, transform
 from functools import partial
+from itertools import count
 
 # MVC tools imports
 import mvctools
-from mvctools.common import Color, xytuple, update_rect_list
+from mvctools.common import Color, xytuple, update_rect_list, SpatialGrid
 
 
 # Base view class
@@ -18,6 +19,9 @@ class BaseView(object):
     bgd_color = None
     sprite_class_dct = {}
 
+    # Sprite classes resolved for each (view class, model class) pair
+    _sprite_class_cache = {}
+
     def __init__(self, parent, model):
         # Attributes to higher instances
         self.parent = parent
@@ -30,6 +34,10 @@ class BaseView(object):
         self.group = AutoGroup()
         self.screen = None
         self.background = None
+        # Model events
+        self.synced = False
+        self.model_events = []
+        self.model.add_listener(self.queue_model_event)
         # Call user initialisation
         self.init()
 
@@ -70,6 +78,12 @@ class BaseView(object):
                                      self.transparent, self.resource.scale)
 
     def _update(self):
+        timed = self.state.frame_timer.timed
+        screen = timed("sprites", self._sync)
+        dirty = timed("draw", self._draw)
+        return screen, dirty
+
+    def _sync(self):
         # Create screen
         self.update_screen()
         # Update
@@ -81,10 +95,11 @@ class BaseView(object):
             self.reset_screen()
         # Create screen
         self.update_screen()
-        # Draw and display
-        dirty = self.group.draw(self.screen, self.background)
-        # Return
-        return self.screen, dirty
+        return self.screen
+
+    def _draw(self):
+        # Only reads the sprites, not the model
+        return self.group.draw(self.screen, self.background)
 
     def update(self):
         pass
@@ -95,13 +110,44 @@ class BaseView(object):
         for sprite in self.group:
             sprite.delete()
         self.sprite_dct.clear()
+        self.model.remove_listener(self.queue_model_event)
+        self.model_events = []
         self.parent = None
 
+    def queue_model_event(self, event, model):
+        if self.synced:
+            self.model_events.append((event, model, model.key))
+
     def update_sprites(self):
-        keys = self.recursive_creation(self.model)
-        removed = set(self.sprite_dct).difference(keys)
-        for key in removed:
+        # Full synchronization
+        if not self.synced:
+            keys = self.recursive_creation(self.model)
+            removed = set(self.sprite_dct).difference(keys)
+            for key in removed:
+                self.delete_sprite(key)
+            self.synced = True
+            return
+        # Process the last event of each key
+        events, self.model_events = self.model_events, []
+        last = {key: (event, model) for event, model, key in events}
+        # Removed models, or keys reused by another model
+        for key, (event, model) in last.items():
+            sprite = self.sprite_dct.get(key)
+            if event == "add":
+                if sprite is None or sprite.model is model:
+                    continue
+                model = sprite.model
             self.delete_sprite(key)
+            for key, _ in model.gen_model_dct():
+                self.delete_sprite(key)
+        # Added models
+        for key, (event, model) in last.items():
+            if event == "add":
+                self.recursive_creation(model)
+
+    def resync(self):
+        self.synced = False
+        self.model_events = []
 
     def recursive_creation(self, model):
         sprite = self.create_sprite(model)
@@ -112,15 +158,28 @@ class BaseView(object):
 
     def create_sprite(self, obj):
         if obj.key not in self.sprite_dct:
-            try:
-                cls = next(self.sprite_class_dct[cls]
-                               for cls in self.sprite_class_dct
-                                   if isinstance(obj, cls))
-            except StopIteration:
+            cls = self.get_sprite_class(type(obj))
+            if cls is None:
                 return
+            # The render thread might be drawing the group
+            if self.root:
+                self.state.finish_render()
             self.sprite_dct[obj.key] = cls(self, model=obj)
         return self.sprite_dct[obj.key]
 
+    @classmethod
+    def get_sprite_class(cls, model_cls):
+        key = cls, model_cls
+        try:
+            return cls._sprite_class_cache[key]
+        except KeyError:
+            pass
+        sprite_cls = next((cls.sprite_class_dct[base]
+                           for base in cls.sprite_class_dct
+                               if issubclass(model_cls, base)), None)
+        cls._sprite_class_cache[key] = sprite_cls
+        return sprite_cls
+
     def delete_sprite(self, key):
         sprite = self.sprite_dct.pop(key, None)
         if sprite:
@@ -129,8 +188,12 @@ class BaseView(object):
     @classmethod
     def register_sprite_class(cls, obj_cls, sprite_cls):
         cls.sprite_class_dct[obj_cls] = sprite_cls
+        BaseView._sprite_class_cache.clear()
 
     def gen_sprites_at(self, pos):
+        # The render thread updates the sprite positions
+        if self.root:
+            self.state.finish_render()
         for sprite in reversed(self.group.get_sprites_at(pos)):
             if sprite.has_view:
                 for sub in sprite.gen_sprites_at(pos):
@@ -360,11 +423,55 @@ class PatchedLayeredDirty(LayeredDirty):
 
 # Autogroup class
 class AutoGroup(PatchedLayeredDirty):
+    """Sprite group with a spatial index for the position queries.
+
+    The index is a uniform grid of the rectangles drawn on the screen,
+    as stored in **spritedict**. A sprite is indexed when it is added,
+    then moved in the grid while preparing the drawing, only when its
+    rectangle changed.
+    """
+
+    #: Size of the grid cells in pixels
+    cell_size = 64
 
     def __init__(self, *args, **kwargs):
+        self._grid = SpatialGrid(self.cell_size)
+        self._order = {}
+        self._counter = count()
         kwargs.setdefault("_time_threshold", 9e9)
         LayeredDirty.__init__(self, *args, **kwargs)
 
+    def add_internal(self, sprite, layer=None):
+        LayeredDirty.add_internal(self, sprite, layer)
+        self._order[sprite] = next(self._counter)
+        self._grid.set(sprite, self.spritedict[sprite])
+
+    def remove_internal(self, sprite):
+        LayeredDirty.remove_internal(self, sprite)
+        self._grid.discard(sprite)
+        del self._order[sprite]
+
+    def change_layer(self, sprite, new_layer):
+        LayeredDirty.change_layer(self, sprite, new_layer)
+        # The sprite goes on top of its new layer
+        if sprite in self._order:
+            self._order[sprite] = next(self._counter)
+
+    def _prepare_sprite(self, sprite):
+        new_rect = PatchedLayeredDirty._prepare_sprite(self, sprite)
+        if new_rect != self.spritedict[sprite]:
+            self._grid.set(sprite, new_rect)
+        return new_rect
+
+    def get_sprites_at(self, pos):
+        """Return the sprites drawn at a given position.
+
+        Bottom sprites are listed first, the top ones are listed last.
+        """
+        layers, order = self._spritelayers, self._order
+        key = lambda sprite: (layers[sprite], order[sprite])
+        return sorted(self._grid.query(pos), key=key)
+
     def reset_update(self):
         self._use_update = False
 